@@ -0,0 +1,257 @@
+import os
+import numpy as np
+import cv2
+
+
+def points_in_polygon(points, polygon):
+    """
+    Even-odd ray casting for many points at once. Returns a boolean array with one entry per point
+    telling whether it lies inside the polygon, vectorised over points and polygon edges.
+    """
+    polygon = np.asarray(polygon, dtype=float)
+    x = points[:, 0, None]
+    y = points[:, 1, None]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    straddles = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(straddles & (x < x_cross), axis=1) % 2 == 1
+
+
+def segment_crossings(p, q, a, b):
+    """
+    Tests the motion segments p->q (N, 2) against the lines a->b (L, 2), all at once.
+
+    Returns an (N, L) int array: +1 where a point moved from the right to the left side of a->b
+    (side = sign of cross(b - a, point - a), with points on the line counted as left), -1 for the
+    opposite direction and 0 where the segments do not intersect.
+    """
+    ab = (b - a)[None]  # (1, L, 2)
+    pa = p[:, None] - a[None]
+    qa = q[:, None] - a[None]
+    side_p = ab[..., 0] * pa[..., 1] - ab[..., 1] * pa[..., 0] >= 0
+    side_q = ab[..., 0] * qa[..., 1] - ab[..., 1] * qa[..., 0] >= 0
+    pq = (q - p)[:, None]  # (N, 1, 2)
+    ap = a[None] - p[:, None]
+    bp = b[None] - p[:, None]
+    d_a = pq[..., 0] * ap[..., 1] - pq[..., 1] * ap[..., 0]
+    d_b = pq[..., 0] * bp[..., 1] - pq[..., 1] * bp[..., 0]
+    crossed = (side_p != side_q) & (d_a * d_b <= 0)
+    return np.where(crossed, np.where(side_q, 1, -1), 0)
+
+
+class ZoneIndex:
+    """
+    Raster index of zone polygons. All zones are drawn once into a label image at frame resolution
+    in which bit z of a pixel is set when the pixel lies in zone z, so zones may overlap and testing
+    any number of points against all zones is a single array lookup whose cost does not depend on
+    the number of zones or polygon vertices. Pixels take the smallest unsigned integer type that
+    holds one bit per zone, with additional 64-bit planes beyond 64 zones.
+    """
+
+    def __init__(self, zones, frame_size):
+        self.width, self.height = int(frame_size[0]), int(frame_size[1])
+        self.num_zones = len(zones)
+        bits = min(max(self.num_zones, 1), 64)
+        dtype = next(t for t in (np.uint8, np.uint16, np.uint32, np.uint64) if np.dtype(t).itemsize * 8 >= bits)
+        self.labels = np.zeros((max(1, -(-self.num_zones // 64)), self.height, self.width), dtype=dtype)
+        self.planes = np.arange(self.num_zones) // 64
+        self.shifts = (np.arange(self.num_zones) % 64).astype(dtype)
+
+        mask = np.zeros((self.height, self.width), dtype=np.uint8)
+        for z, zone in enumerate(zones):
+            mask[:] = 0
+            cv2.fillPoly(mask, [np.round(np.asarray(zone, dtype=float)).astype(np.int32).reshape(-1, 1, 2)], 1)
+            self.labels[self.planes[z]][mask.view(bool)] |= dtype(1) << self.shifts[z]
+
+    def lookup(self, points):
+        """
+        Returns the (N, zones) boolean membership of (N, 2) [x, y] points; points outside the frame
+        are in no zone.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        x = np.floor(points[:, 0]).astype(np.int64)
+        y = np.floor(points[:, 1]).astype(np.int64)
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        words = self.labels[:, np.clip(y, 0, self.height - 1), np.clip(x, 0, self.width - 1)]
+        bits = (words[self.planes] >> self.shifts[:, None]) & self.labels.dtype.type(1)
+        return (bits.T != 0) & inside[:, None]
+
+
+class TrackAnalytics:
+    """
+    Line-crossing and dwell-time analytics over Sort.update output.
+
+    Feed the (N, 5) [x1,y1,x2,y2,id] array of every frame to update(). Per-track state (last anchor
+    point, frame last seen, zone membership and dwell frames per zone) lives in preallocated arrays
+    indexed by track ID that grow geometrically, so each frame costs a handful of vectorised
+    operations regardless of how many tracks are alive.
+
+    Anchors are box centres by default, as in PeopleCounter, or bottom centres (feet) with
+    anchor='bottom'. Given the `frame_size` (width, height), zone membership is looked up in a
+    ZoneIndex instead of testing every polygon. Line crossings are counted per line as [positive, negative] direction totals
+    (see segment_crossings); a track that disappears and reappears is tested from its last
+    known position.
+    """
+
+    def __init__(self, zones=(), lines=(), fps=25., anchor='center', capacity=1024, frame_size=None):
+        self.zones = [np.asarray(zone, dtype=float) for zone in zones]
+        self.index = ZoneIndex(self.zones, frame_size) if frame_size is not None and self.zones else None
+        lines = np.asarray(lines, dtype=float).reshape(-1, 4)
+        self.line_a, self.line_b = lines[:, :2], lines[:, 2:]
+        self.fps = float(fps) if fps else 25.
+        self.anchor = anchor
+        self.frame_index = -1
+
+        self.line_counts = np.zeros((len(lines), 2), dtype=np.int64)  # [positive, negative] per line
+        self.zone_entries = np.zeros(len(self.zones), dtype=np.int64)
+        self.zone_occupancy = np.zeros(len(self.zones), dtype=np.int64)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'last_point', None)
+        last_point = np.zeros((capacity, 2))
+        last_seen = np.full(capacity, -1, dtype=np.int64)
+        in_zone = np.zeros((capacity, len(self.zones)), dtype=bool)
+        dwell_frames = np.zeros((capacity, len(self.zones)), dtype=np.int64)
+        if old is not None:
+            n = len(old)
+            last_point[:n] = self.last_point
+            last_seen[:n] = self.last_seen
+            in_zone[:n] = self.in_zone
+            dwell_frames[:n] = self.dwell_frames
+        self.last_point, self.last_seen, self.in_zone, self.dwell_frames = last_point, last_seen, in_zone, dwell_frames
+
+    def anchors(self, tracks):
+        if self.anchor == 'bottom':
+            return np.stack(((tracks[:, 0] + tracks[:, 2]) / 2., tracks[:, 3]), axis=1)
+        return np.stack(((tracks[:, 0] + tracks[:, 2]) / 2., (tracks[:, 1] + tracks[:, 3]) / 2.), axis=1)
+
+    def update(self, tracks):
+        """
+        Processes one frame of tracker output. Returns (in_zone, crossings): an (N, zones) boolean
+        membership array and an (N, lines) array of crossing directions, aligned with `tracks`.
+        """
+        self.frame_index += 1
+        tracks = np.asarray(tracks, dtype=float).reshape(-1, 5)
+        ids = tracks[:, 4].astype(np.int64)
+        if len(ids) and ids.max() >= len(self.last_seen):
+            self._allocate(max(2 * len(self.last_seen), int(ids.max()) + 1))
+        points = self.anchors(tracks)
+
+        if self.index is not None:
+            in_zone = self.index.lookup(points)
+        else:
+            in_zone = np.zeros((len(ids), len(self.zones)), dtype=bool)
+            for z, zone in enumerate(self.zones):
+                in_zone[:, z] = points_in_polygon(points, zone)
+        self.zone_entries += np.count_nonzero(in_zone & ~self.in_zone[ids], axis=0)
+        self.zone_occupancy = np.count_nonzero(in_zone, axis=0)
+        self.in_zone[ids] = in_zone
+        self.dwell_frames[ids] += in_zone
+
+        crossings = np.zeros((len(ids), len(self.line_a)), dtype=np.int64)
+        seen = self.last_seen[ids] >= 0
+        if len(self.line_a) and seen.any():
+            crossings[seen] = segment_crossings(self.last_point[ids[seen]], points[seen], self.line_a, self.line_b)
+            self.line_counts[:, 0] += np.count_nonzero(crossings > 0, axis=0)
+            self.line_counts[:, 1] += np.count_nonzero(crossings < 0, axis=0)
+        self.last_point[ids] = points
+        self.last_seen[ids] = self.frame_index
+        return in_zone, crossings
+
+    def dwell_seconds(self, zone=0):
+        """
+        Returns (ids, seconds) for every track that spent time in the given zone.
+        """
+        ids = np.flatnonzero(self.dwell_frames[:, zone])
+        return ids, self.dwell_frames[ids, zone] / self.fps
+
+    state_keys = ('frame_index', 'line_counts', 'zone_entries', 'zone_occupancy', 'last_point', 'last_seen',
+                  'in_zone', 'dwell_frames')
+
+    def state_dict(self):
+        # the runtime state only; the zones and lines are kept to check that a resumed job has the same
+        state = {k: getattr(self, k).copy() if isinstance(getattr(self, k), np.ndarray) else getattr(self, k)
+                 for k in self.state_keys}
+        state['zones'], state['lines'] = self.zones, np.hstack((self.line_a, self.line_b))
+        return state
+
+    def load_state_dict(self, state):
+        same_zones = len(state['zones']) == len(self.zones) and all(
+            np.array_equal(a, b) for a, b in zip(state['zones'], self.zones))
+        if not same_zones or not np.array_equal(state['lines'], np.hstack((self.line_a, self.line_b))):
+            raise ValueError('The checkpoint was made with other zones or lines, cannot resume')
+        for k in self.state_keys:
+            setattr(self, k, state[k])
+
+
+class CountsLog:
+    """
+    Compact CSV log of zone occupancy for headless runs. Every `interval` frames (1 = per frame,
+    fps = per second) it appends one row: first frame, its time in seconds, mean and max number of
+    people in the zone, max number of people detected or tracked, and the track IDs seen in the
+    zone (space separated, empty when there is no tracker).
+
+    state_dict() records the file offset, so a job resumed from a checkpoint first drops the rows
+    written after that checkpoint.
+    """
+
+    header = 'frame,seconds,mean_in_zone,max_in_zone,max_total,ids_in_zone\n'
+
+    def __init__(self, path, fps=25., interval=1, resume=False):
+        self.fps = float(fps) if fps else 25.
+        self.interval = max(1, int(round(interval)))
+        self.file = open(path, 'a' if resume and os.path.exists(path) else 'w', newline='')
+        if self.file.tell() == 0:
+            self.file.write(self.header)
+        self._reset()
+
+    def _reset(self):
+        self.start = None
+        self.frames = 0
+        self.in_zone_sum = 0
+        self.in_zone_max = 0
+        self.total_max = 0
+        self.ids = set()
+
+    def add(self, frame_index, in_zone, total, ids=()):
+        """
+        Records one frame: `in_zone` people in the zone out of `total`, `ids` of those in the zone.
+        """
+        if self.start is None:
+            self.start = frame_index
+        self.frames += 1
+        self.in_zone_sum += int(in_zone)
+        self.in_zone_max = max(self.in_zone_max, int(in_zone))
+        self.total_max = max(self.total_max, int(total))
+        self.ids.update(int(i) for i in ids)
+        if (frame_index + 1) % self.interval == 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending row, if any.
+        """
+        if self.frames:
+            self.file.write('%d,%.3f,%.2f,%d,%d,%s\n' % (
+                self.start, self.start / self.fps, self.in_zone_sum / float(self.frames), self.in_zone_max,
+                self.total_max, ' '.join(str(i) for i in sorted(self.ids))))
+        self._reset()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def state_dict(self):
+        self.file.flush()
+        return {'offset': self.file.tell(), 'start': self.start, 'frames': self.frames,
+                'in_zone_sum': self.in_zone_sum, 'in_zone_max': self.in_zone_max, 'total_max': self.total_max,
+                'ids': set(self.ids)}
+
+    def load_state_dict(self, state):
+        self.file.truncate(state['offset'])
+        self.start, self.frames, self.ids = state['start'], state['frames'], set(state['ids'])
+        self.in_zone_sum, self.in_zone_max, self.total_max = \
+            state['in_zone_sum'], state['in_zone_max'], state['total_max']
@@ -0,0 +1,349 @@
+"""
+Offline end-to-end benchmark of the counting pipeline.
+
+Generates a synthetic video of coloured rectangles ("people") walking back and forth in lanes
+across the zone, so the number of people in the zone is known exactly on every frame, and runs it
+through the whole PeopleCounter pipeline (decode, detect, track, zone count, and in the 'full'
+mode annotate and encode) with a deterministic stub detector that finds the rectangles in the
+decoded pixels. Real backends whose weights are already cached locally are benchmarked too (they
+are not trained on rectangles, so only their speed is reported). Every case runs in its own
+process and reports FPS, the per-stage latencies of metrics.py and the peak RSS; for the stub
+detector the per-frame zone counts are checked against the ground truth.
+
+    python benchmark_pipeline.py --frames 300 --people 5 20 --modes headless full live
+    python benchmark_pipeline.py --delay 0.02 --batch-size 4 --save-baseline pipeline.json
+    python benchmark_pipeline.py --compare pipeline.json --tolerance 0.25
+    python benchmark_pipeline.py --backends auto   # plus every backend with cached weights
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+import cv2
+
+from counter import PeopleCounter, DEFAULT_ZONE
+from detectors import Detector, as_detections, load_detector
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLASSES = os.path.join(HERE, 'classes.txt')
+
+
+def synthetic_video(path, num_frames=300, frame_size=(1280, 1152), num_people=10, speed=6., box_size=(40, 100),
+                    fps=25, seed=0, source_size=None):
+    """
+    Writes a video of `num_people` saturated rectangles on a grey, lightly textured background.
+    Every person walks left and right in a horizontal lane of its own at about `speed` px/frame
+    and bounces off the borders, so people never overlap and cross the zone borders again and
+    again. Scenes are drawn at `frame_size` and encoded at `source_size` (default: the same), so
+    the counter resizes them back to where the ground truth holds.
+
+    Returns the ground truth: one (num_people, 4) array of [x1,y1,x2,y2] boxes per frame, in
+    `frame_size` coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    lane = height / float(num_people)
+    # only the height shrinks with the lanes: narrow boxes that bounce lose their SORT track (IoU)
+    size = np.array([box_size[0], min(box_size[1], lane * 0.8)])
+    x = rng.uniform(0, width - size[0], num_people)
+    velocity = speed * rng.uniform(0.5, 1.5, num_people) * rng.choice((-1, 1), num_people)
+    y = (np.arange(num_people) + 0.5) * lane - size[1] / 2
+    colours = [tuple(int(c) for c in cv2.cvtColor(np.uint8([[[h, 255, 220]]]), cv2.COLOR_HSV2BGR)[0, 0])
+               for h in rng.integers(0, 180, num_people)]
+    background = (128 + rng.integers(-8, 9, (height, width, 3))).astype(np.uint8)
+
+    source_size = tuple(source_size or frame_size)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, source_size)
+    truth = []
+    for _ in range(num_frames):
+        frame = background.copy()
+        boxes = np.stack((x, y, x + size[0], y + size[1]), axis=1)
+        for (x1, y1, x2, y2), colour in zip(np.round(boxes).astype(int), colours):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), colour, -1)
+        writer.write(frame if source_size == frame_size else cv2.resize(frame, source_size))
+        truth.append(boxes)
+        x += velocity
+        bounce = (x < 0) | (x > width - size[0])
+        velocity[bounce] *= -1
+        x = np.clip(x, 0, width - size[0])
+    writer.release()
+    return truth
+
+
+class StubDetector(Detector):
+    """
+    Deterministic detector of the synthetic people: saturated pixels (HSV saturation above
+    `threshold`, the background is grey) are grouped into connected components, and every
+    component of at least `min_area` pixels is a person with score 0.9. `delay` seconds of sleep
+    per frame stand in for the cost of a real model.
+    """
+
+    def __init__(self, threshold=100, min_area=100, delay=0.):
+        self.threshold = threshold
+        self.min_area = min_area
+        self.delay = delay
+
+    def detect(self, frames):
+        detections = []
+        for frame in frames:
+            if self.delay:
+                time.sleep(self.delay)
+            saturation = cv2.extractChannel(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), 1)
+            mask = cv2.threshold(saturation, self.threshold, 1, cv2.THRESH_BINARY)[1]
+            _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            stats = stats[1:][stats[1:, cv2.CC_STAT_AREA] >= self.min_area]
+            x, y, w, h = (stats[:, i].astype(float) for i in range(4))
+            detections.append(as_detections(np.stack((x, y, x + w, y + h), axis=1), np.full(len(stats), 0.9),
+                                            np.zeros(len(stats))))
+        return detections
+
+
+def truth_counts(truth, zones, border=8.):
+    """
+    Returns the range of correct counts of people in any zone on every frame, as (low, high)
+    arrays, with the box-centre anchor PeopleCounter uses. Tracked boxes are Kalman estimates,
+    not the drawn ones, so a person whose centre is within `border` px of a zone border may be
+    counted either way: `low` only counts the people clearly inside, `high` also the ones near.
+    """
+    contours = [np.asarray(zone, dtype=np.float32).reshape(-1, 1, 2) for zone in zones]
+    low, high = [], []
+    for boxes in truth:
+        centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+        # signed distance to the nearest zone border, positive inside
+        distance = np.array([max(cv2.pointPolygonTest(c, (float(x), float(y)), True) for c in contours)
+                             for x, y in centres]).reshape(-1)
+        low.append(np.count_nonzero(distance > border))
+        high.append(np.count_nonzero(distance >= -border))
+    return np.array(low), np.array(high)
+
+
+def cached_backends():
+    """
+    Returns {backend: options} for the real backends whose default weights are already on disk,
+    so benchmarking them downloads nothing.
+    """
+    home = os.path.expanduser('~')
+    hub = os.path.join(os.environ.get('TORCH_HOME', os.path.join(home, '.cache', 'torch')), 'hub')
+    candidates = {
+        'yolov8': ({'model': 'yolov8s.pt'}, [os.path.join(HERE, 'yolov8s.pt')]),
+        'onnx': ({'model': 'yolov8s_int8.onnx'}, [os.path.join(HERE, 'yolov8s_int8.onnx')]),
+        'yolov5': ({}, [os.path.join(hub, 'ultralytics_yolov5_master'), os.path.join(HERE, 'yolov5x6.pt')]),
+        'yolo_nas': ({}, [os.path.join(hub, 'checkpoints', 'yolo_nas_s_coco.pth')]),
+    }
+    found = {}
+    for backend, (options, paths) in candidates.items():
+        if all(os.path.exists(p) for p in paths):
+            found[backend] = {k: os.path.join(HERE, v) if k == 'model' else v for k, v in options.items()}
+    return found
+
+
+class RecordingCounter(PeopleCounter):
+    """
+    PeopleCounter that records the number of people in the zones on every frame.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.zone_counts = []
+
+    def infer_batch(self, videos, detect=None, start=None):
+        results = super().infer_batch(videos, detect, start)
+        self.zone_counts.extend(np.count_nonzero(in_zone.any(axis=1)) for _, _, in_zone in results)
+        return results
+
+
+def run_case(video_path, backend, options, mode, frame_size, batch_size, stride, delay):
+    """
+    Counts the video with one backend ('stub' or a real one) in one mode ('headless', 'full' or
+    'live') and returns the timings, the peak RSS, the per-frame zone counts and the number of frames in
+    the output video (None when headless). Runs in a fresh process.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        if backend == 'stub':
+            detector = StubDetector(delay=delay)
+        else:
+            detector = load_detector(backend, **dict(options, classes=[0]))
+        counter = RecordingCounter(video_path, os.path.join(tmp, 'out.mp4'), CLASSES, detector_stride=stride,
+                                   headless=mode == 'headless', zones=[DEFAULT_ZONE], frame_size=frame_size,
+                                   detector=detector)
+        setup = time.perf_counter() - start
+        start = time.perf_counter()
+        if mode == 'headless':
+            counter.count_video(os.path.join(tmp, 'counts.csv'), batch_size=batch_size)
+        elif mode == 'live':
+            counter.process_stream(latency=1., replay=True, preview=False)
+        else:
+            counter.process_video(batch_size=batch_size, preview=False)
+        seconds = time.perf_counter() - start
+        written = None if mode == 'headless' else count_frames(os.path.join(tmp, 'out.mp4'))
+
+    stages = counter.metrics.snapshot()['stages']
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'frames': len(counter.zone_counts),
+        'setup_s': setup,
+        'fps': len(counter.zone_counts) / max(seconds, 1e-9),
+        'stages_ms': {name: s['total_s'] * 1000 / max(len(counter.zone_counts), 1) for name, s in stages.items()},
+        'peak_rss_mb': rss / 1024. ** (2 if sys.platform == 'darwin' else 1),
+        'zone_counts': [int(c) for c in counter.zone_counts],
+        # every processed frame is written once
+        'processed': counter.metrics.frames,
+        'written': written,
+    }
+
+
+def count_frames(path):
+    """
+    Returns the number of frames that can be decoded from a video file.
+    """
+    cap = cv2.VideoCapture(path)
+    frames = 0
+    while cap.grab():
+        frames += 1
+    cap.release()
+    return frames
+
+
+def check_counts(counts, truth, warmup=3):
+    """
+    Compares the per-frame zone counts with the ground-truth (low, high) ranges of truth_counts,
+    after the first `warmup` frames (SORT confirms tracks over its first frames). Returns the
+    fraction of frames counted correctly and the mean absolute error to the range.
+    """
+    low, high = (np.asarray(t[warmup:len(counts)]) for t in truth)
+    counts = np.asarray(counts[warmup:])
+    if len(counts) == 0:
+        return 0., float('inf')
+    error = np.maximum(low - counts, 0) + np.maximum(counts - high, 0)
+    return float(np.mean(error == 0)), float(error.mean())
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a regression message for every case whose FPS dropped by more than `tolerance` (a
+    fraction) against the baseline.
+    """
+    regressions = []
+    for case, r in results['cases'].items():
+        base = baseline.get('cases', {}).get(case)
+        if base is not None and r['fps'] < base['fps'] * (1. - tolerance):
+            regressions.append('%s: %.1f fps -> %.1f fps (-%.0f%%)' % (
+                case, base['fps'], r['fps'], (1. - r['fps'] / base['fps']) * 100))
+    return regressions
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='End-to-end people counting benchmark on synthetic video')
+    parser.add_argument('--frames', type=int, default=300, help='Frames per synthetic video.')
+    parser.add_argument('--people', type=int, nargs='+', default=[5, 20], help='Crowd sizes to benchmark.')
+    parser.add_argument('--speed', type=float, default=6., help='Walking speed in px/frame.')
+    parser.add_argument('--size', default='1280x1152',
+                        help='Frame size WIDTHxHEIGHT frames are processed at (the zone is the mall zone).')
+    parser.add_argument('--source-size', default='960x1080',
+                        help='Size WIDTHxHEIGHT the synthetic video is encoded at (the mall video\'s by default).')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--modes', nargs='+', choices=['headless', 'full', 'live'],
+                        default=['headless', 'full', 'live'],
+                        help='headless: detect, track and count; full: also annotate and encode; live: full on '
+                             'the video replayed as a stream at its frame rate (FPS is capped by --fps).')
+    parser.add_argument('--backends', nargs='*', default=[],
+                        help="Real backends to run besides the stub, as NAME or NAME:MODEL, or 'auto' for all "
+                             "backends with cached weights.")
+    parser.add_argument('--delay', type=float, default=0., help='Seconds the stub detector sleeps per frame.')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--min-correct', type=float, default=0.99,
+                        help='Fraction of frames the stub run must count correctly to pass.')
+    parser.add_argument('--border', type=float, default=8.,
+                        help='Distance to a zone border (px) within which a person may be counted either way.')
+    parser.add_argument('--save-baseline', dest='save_baseline', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Compare against this JSON baseline; exit 1 on regression.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed FPS drop before flagging a regression.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    frame_size = tuple(int(v) for v in args.size.lower().split('x'))
+    source_size = tuple(int(v) for v in args.source_size.lower().split('x'))
+    backends = {'stub': {}}
+    for name in args.backends:
+        if name == 'auto':
+            backends.update(cached_backends())
+        else:
+            backend, _, model = name.partition(':')
+            backends[backend] = {'model': model} if model else {}
+
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'compare')},
+        'platform': {'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__,
+                     'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'cases': {},
+    }
+    failed, unwritten = [], []
+    context = multiprocessing.get_context('spawn')
+    print('%-28s %8s %10s %9s %8s  %s' % ('case', 'fps', 'rss MiB', 'correct', 'mae', 'ms/frame by stage'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for people in args.people:
+            video = os.path.join(tmp, 'synthetic-%d.mp4' % people)
+            truth = truth_counts(synthetic_video(video, args.frames, frame_size, people, args.speed, fps=args.fps,
+                                                 seed=args.seed + people, source_size=source_size),
+                                 [DEFAULT_ZONE], args.border)
+            for backend, options in backends.items():
+                for mode in args.modes:
+                    case = '%s/%s/%d people' % (backend, mode, people)
+                    # a fresh process per case, so the peak RSS is the case's own
+                    with context.Pool(1) as pool:
+                        r = pool.apply(run_case, (video, backend, options, mode, frame_size, args.batch_size,
+                                                  args.stride, args.delay))
+                    if backend == 'stub':
+                        r['correct'], r['mae'] = check_counts(r['zone_counts'], truth)
+                        if r['correct'] < args.min_correct:
+                            failed.append(case)
+                    if r['written'] is not None and r['written'] != r['processed']:
+                        unwritten.append('%s (%d of %d frames)' % (case, r['written'], r['processed']))
+                    del r['zone_counts']
+                    results['cases'][case] = r
+                    stages = ' '.join('%s %.1f' % item for item in
+                                      sorted(r['stages_ms'].items(), key=lambda item: -item[1]))
+                    print('%-28s %8.1f %10.0f %9s %8s  %s' % (
+                        case, r['fps'], r['peak_rss_mb'], '%.1f%%' % (r['correct'] * 100) if 'correct' in r else '-',
+                        '%.3f' % r['mae'] if 'mae' in r else '-', stages))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Saved baseline to %s' % args.save_baseline)
+
+    status = 0
+    if failed:
+        print('Zone counts below %.0f%% correct frames: %s' % (args.min_correct * 100, ', '.join(failed)))
+        status = 1
+    if unwritten:
+        print('Output video missing frames: %s' % ', '.join(unwritten))
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions against %s:' % args.compare)
+            for line in regressions:
+                print('  ' + line)
+            status = 1
+        else:
+            print('No regressions against %s (tolerance %.0f%%).' % (args.compare, args.tolerance * 100))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Scalability benchmark for the SORT tracker on synthetic crowds.
+
+Generates MOT-format detection streams (configurable crowd size, motion, occlusion and
+false-positive rate) and times Sort.update, associate_detections_to_trackers, iou_batch and
+linear_assignment separately, reporting per-frame latency percentiles and peak memory for
+each crowd size. Results can be saved as a JSON baseline and later compared against it.
+
+    python benchmark_sort.py --sizes 10 100 1000 --save-baseline baseline.json
+    python benchmark_sort.py --compare baseline.json --tolerance 0.25
+    python benchmark_sort.py --write-mot data --sizes 50   # feed sort.py --seq_path data
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+import sort
+from sort import Sort, KalmanBoxTracker, iou_batch, linear_assignment
+
+PERCENTILES = (50, 90, 99)
+
+
+def generate_crowd(num_people, num_frames, density=100., speed=2., occlusion=0.05, occlusion_length=10,
+                   fp_rate=0.02, noise=1.5, box_size=(40, 100), seed=0):
+    """
+    Generates a synthetic detection stream of a crowd of people walking around a scene.
+
+    The scene area grows with the crowd so that it keeps `density` people per megapixel. Each person
+    performs a smoothed random walk at about `speed` px/frame and bounces off the borders. With
+    probability `occlusion` per frame a visible person becomes occluded for a geometric number of
+    frames (mean `occlusion_length`); `fp_rate * num_people` false positives are added per frame
+    on average, and `noise` px of jitter is applied to every box corner.
+
+    Returns a list with one (N, 5) array of [x1,y1,x2,y2,score] per frame.
+    """
+    rng = np.random.default_rng(seed)
+    area = max(num_people, 1) / density * 1e6
+    scene = np.maximum(np.sqrt([area * 16 / 9, area * 9 / 16]), 2 * np.array(box_size))
+    size = np.array(box_size, dtype=float) * rng.uniform(0.8, 1.2, (num_people, 1))
+    pos = rng.uniform(0, 1, (num_people, 2)) * (scene - size)
+    heading = rng.uniform(0, 2 * np.pi, num_people)
+    hidden = np.zeros(num_people, dtype=int)
+
+    frames = []
+    for _ in range(num_frames):
+        heading += rng.normal(0, 0.2, num_people)
+        pos += speed * np.stack((np.cos(heading), np.sin(heading)), axis=1)
+        low, high = pos < 0, pos > scene - size
+        pos = np.clip(pos, 0, scene - size)
+        heading[low[:, 0] | high[:, 0]] = np.pi - heading[low[:, 0] | high[:, 0]]
+        heading[low[:, 1] | high[:, 1]] = -heading[low[:, 1] | high[:, 1]]
+
+        hidden = np.maximum(hidden - 1, 0)
+        start = (hidden == 0) & (rng.random(num_people) < occlusion)
+        hidden[start] = rng.geometric(1. / occlusion_length, start.sum())
+        visible = hidden == 0
+
+        boxes = np.concatenate((pos, pos + size), axis=1)[visible]
+        boxes += rng.normal(0, noise, boxes.shape)
+        num_fp = rng.poisson(fp_rate * num_people)
+        fp_pos = rng.uniform(0, 1, (num_fp, 2)) * (scene - box_size)
+        fp = np.concatenate((fp_pos, fp_pos + rng.uniform(0.5, 1.5, (num_fp, 2)) * box_size), axis=1)
+
+        dets = np.concatenate((boxes, fp))
+        dets = np.concatenate((dets, rng.uniform(0.5, 1., (len(dets), 1))), axis=1)
+        frames.append(dets[rng.permutation(len(dets))])
+    return frames
+
+
+def write_mot(frames, path):
+    """
+    Writes a detection stream as a MOT det.txt (frame,id,x,y,w,h,score,-1,-1,-1), frames numbered from 1.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        for frame, dets in enumerate(frames, 1):
+            for x1, y1, x2, y2, score in dets:
+                f.write('%d,-1,%.2f,%.2f,%.2f,%.2f,%.3f,-1,-1,-1\n' % (frame, x1, y1, x2 - x1, y2 - y1, score))
+
+
+def summarize(samples):
+    """
+    Returns latency statistics in milliseconds for a list of per-call timings in seconds.
+    """
+    ms = np.asarray(samples) * 1000.
+    if len(ms) == 0:
+        return {'calls': 0}
+    stats = {'calls': len(ms), 'mean': float(ms.mean()), 'max': float(ms.max())}
+    for p in PERCENTILES:
+        stats['p%d' % p] = float(np.percentile(ms, p))
+    return stats
+
+
+def time_calls(fn, args_list, repeat=1):
+    """
+    Times fn(*args) for every argument tuple, keeping the best of `repeat` runs per call.
+    """
+    samples = []
+    for args in args_list:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(*args)
+            best = min(best, time.perf_counter() - start)
+        samples.append(best)
+    return samples
+
+
+def benchmark_size(frames, max_age=1, min_hits=3, iou_threshold=0.3, gated=False, repeat=1):
+    """
+    Runs one detection stream through Sort and times each tracking component.
+
+    Sort.update is timed end to end while the (detections, predicted tracks) pairs it hands to
+    association are recorded; the association building blocks are then timed on those same inputs.
+    """
+    name = 'associate_detections_to_trackers_gated' if gated else 'associate_detections_to_trackers'
+    associate = getattr(sort, name)
+    recorded = []
+
+    def recording(dets, trks, threshold):
+        recorded.append((dets, trks))
+        return associate(dets, trks, threshold)
+
+    KalmanBoxTracker.count = 0
+    tracker = Sort(max_age=max_age, min_hits=min_hits, iou_threshold=iou_threshold, gated=gated)
+    update_times = []
+    num_tracks = 0
+    setattr(sort, name, recording)
+    try:
+        for dets in frames:
+            start = time.perf_counter()
+            out = tracker.update(dets)
+            update_times.append(time.perf_counter() - start)
+            num_tracks += len(out)
+    finally:
+        setattr(sort, name, associate)
+
+    # memory is measured in a separate pass since tracemalloc slows every allocation down
+    tracker = Sort(max_age=max_age, min_hits=min_hits, iou_threshold=iou_threshold, gated=gated)
+    tracemalloc.start()
+    try:
+        for dets in frames:
+            tracker.update(dets)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    pairs = [(d, t) for d, t in recorded if len(d) and len(t)]
+    iou_matrices = [iou_batch(d, t) for d, t in pairs]
+    return {
+        'frames': len(frames),
+        'detections_per_frame': float(np.mean([len(d) for d in frames])),
+        'tracks_per_frame': num_tracks / float(len(frames)),
+        'peak_memory_kb': peak / 1024.,
+        'sort_update': summarize(update_times),
+        'associate': summarize(time_calls(associate, [(d, t, iou_threshold) for d, t in recorded], repeat)),
+        'iou_batch': summarize(time_calls(iou_batch, pairs, repeat)),
+        'linear_assignment': summarize(time_calls(linear_assignment, [(-m,) for m in iou_matrices], repeat)),
+    }
+
+
+def compare(results, baseline, tolerance, metric='p50'):
+    """
+    Compares results against a baseline and returns a list of regression messages for every
+    component whose `metric` latency grew by more than `tolerance` (a fraction).
+    """
+    regressions = []
+    for size, components in results['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is None:
+            continue
+        for component, stats in components.items():
+            if not isinstance(stats, dict) or metric not in stats or metric not in base.get(component, {}):
+                continue
+            old, new = base[component][metric], stats[metric]
+            if old > 0 and new > old * (1. + tolerance):
+                regressions.append('%s @ %s objects: %s %.3f ms -> %.3f ms (+%.0f%%)' % (
+                    component, size, metric, old, new, (new / old - 1.) * 100))
+    return regressions
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='SORT scalability benchmark on synthetic crowds')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100, 250, 500, 1000],
+                        help='Crowd sizes (number of people) to benchmark.')
+    parser.add_argument('--frames', type=int, default=100, help='Frames per synthetic sequence.')
+    parser.add_argument('--density', type=float, default=100., help='People per megapixel of scene.')
+    parser.add_argument('--speed', type=float, default=2., help='Walking speed in px/frame.')
+    parser.add_argument('--occlusion', type=float, default=0.05, help='Per-frame probability a person gets occluded.')
+    parser.add_argument('--fp_rate', type=float, default=0.02, help='False positives per frame, as a fraction of the crowd.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max_age', type=int, default=1)
+    parser.add_argument('--min_hits', type=int, default=3)
+    parser.add_argument('--iou_threshold', type=float, default=0.3)
+    parser.add_argument('--gated', action='store_true', help='Benchmark the sparse grid-gated association.')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats per component call (best is kept).')
+    parser.add_argument('--save-baseline', dest='save_baseline', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='Compare against this JSON baseline; exit 1 on regression.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before flagging a regression.')
+    parser.add_argument('--write-mot', dest='write_mot',
+                        help='Only write the synthetic streams as <dir>/train/synth-<N>/det/det.txt and exit.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    streams = {n: generate_crowd(n, args.frames, density=args.density, speed=args.speed, occlusion=args.occlusion,
+                                 fp_rate=args.fp_rate, seed=args.seed + n)
+               for n in args.sizes}
+
+    if args.write_mot:
+        for n, frames in streams.items():
+            path = os.path.join(args.write_mot, 'train', 'synth-%d' % n, 'det', 'det.txt')
+            write_mot(frames, path)
+            print('Wrote %s' % path)
+        return 0
+
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'compare', 'write_mot')},
+        'platform': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()},
+        'sizes': {},
+    }
+    print('%8s %8s %8s | %-21s | %-21s | %-21s | %-21s | %9s' % (
+        'objects', 'dets', 'tracks', 'Sort.update p50/p99', 'associate p50/p99', 'iou_batch p50/p99',
+        'linear_assign p50/p99', 'peak KiB'))
+    for n, frames in streams.items():
+        r = benchmark_size(frames, max_age=args.max_age, min_hits=args.min_hits, iou_threshold=args.iou_threshold,
+                           gated=args.gated, repeat=args.repeat)
+        results['sizes'][str(n)] = r
+        cells = ['%9.3f /%9.3f' % (r[c].get('p50', 0.), r[c].get('p99', 0.))
+                 for c in ('sort_update', 'associate', 'iou_batch', 'linear_assignment')]
+        print('%8d %8.1f %8.1f | %s | %9.0f' % (n, r['detections_per_frame'], r['tracks_per_frame'],
+                                                 ' | '.join(cells), r['peak_memory_kb']))
+    print('(latencies in ms per frame)')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Saved baseline to %s' % args.save_baseline)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changed = [k for k, v in results['config'].items()
+                   if k not in ('sizes', 'repeat', 'tolerance') and baseline.get('config', {}).get(k, v) != v]
+        if changed:
+            print('Warning: baseline was recorded with different settings: %s' % ', '.join(changed))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions against %s:' % args.compare)
+            for line in regressions:
+                print('  ' + line)
+            return 1
+        print('No regressions against %s (tolerance %.0f%%).' % (args.compare, args.tolerance * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Persistent cache of the person detections of every frame of a video, so tracking and counting
+can be rerun (new zones, Sort parameters or counting logic) without decoding the video or running
+the detector again.
+
+An entry is keyed by a hash of the video content and of everything the detections depend on
+(backend, weights, input size, confidence threshold, other backend options, frame size, ROI);
+changing any of them gives a new key, so stale detections are never replayed. Each entry is three files in the cache
+directory: <key>.dets, the float32 [x1,y1,x2,y2,score] rows of all frames one after the other,
+<key>.counts, the int32 number of rows of each frame, and <key>.json, the configuration, written
+last to mark the entry complete. The rows are memory-mapped when replayed.
+"""
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import numpy as np
+
+
+def file_digest(path, cache_dir=None):
+    """
+    Returns the SHA-256 of a file's content. With `cache_dir`, digests are remembered there by
+    path, size and modification time, so a large video is only hashed once.
+    """
+    stat = os.stat(path)
+    name = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    index_path = os.path.join(cache_dir, 'digests.json') if cache_dir else None
+    index = {}
+    if index_path and os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    if name not in index:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        index[name] = sha.hexdigest()
+        if index_path:
+            _write_atomic(index_path, json.dumps(index, indent=1).encode())
+    return index[name]
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# backend options that change how fast the detector runs, not what it detects
+RUNTIME_OPTIONS = ('threads',)
+
+
+def detection_config(video_path, backend, detector, backend_options=None, frame_size=(1280, 1152), roi=None,
+                     cache_dir=None):
+    """
+    Returns the configuration the detections of a video depend on, as a JSON-serialisable dict.
+    Weights given as a file are identified by their content, other models by name. The settings of
+    a backend are its constructor options (given or default) other than RUNTIME_OPTIONS. A
+    detector that is not one of the backends is identified by its class and its public scalar
+    attributes, so two differently configured custom detectors do not share entries. The stride
+    is not part of it: every frame is recorded, and the stride picks from them when replaying.
+    """
+    from detectors import BACKENDS
+
+    options = dict(backend_options or {})
+    parameters = inspect.signature(BACKENDS[backend]).parameters if backend in BACKENDS else {}
+    model = options.get('model', parameters['model'].default if 'model' in parameters else None)
+    conf = getattr(detector, 'conf', options.get('conf', parameters['conf'].default if 'conf' in parameters else None))
+    if type(detector) in BACKENDS.values():
+        # model, conf and imgsz are keyed on their own
+        settings = {name: options.get(name, parameter.default) for name, parameter in sorted(parameters.items())
+                    if name not in ('model', 'conf', 'imgsz') + RUNTIME_OPTIONS}
+    else:
+        # full_imgsz is bookkeeping of PeopleCounter's ROI, imgsz is keyed on its own
+        settings = {name: value for name, value in sorted(vars(detector).items())
+                    if not name.startswith('_') and name not in ('full_imgsz', 'imgsz')
+                    and isinstance(value, (bool, int, float, str, type(None)))}
+    return {
+        'version': 3,
+        'video': file_digest(video_path, cache_dir),
+        'backend': backend,
+        'detector': type(detector).__qualname__,
+        'settings': settings,
+        'model': file_digest(model, cache_dir) if isinstance(model, str) and os.path.isfile(model) else model,
+        'imgsz': getattr(detector, 'imgsz', None),
+        'conf': conf,
+        'frame_size': list(frame_size),
+        'roi': list(roi) if roi is not None else None,
+    }
+
+
+class DetectionCache:
+    """
+    One cache entry. If it is complete, `complete` is True and cache[index] returns the (N, 5)
+    detections of frame `index`; otherwise the detections of every frame, from the first one on,
+    are recorded with append() and finish() completes the entry (close() without finish() drops
+    a partial recording).
+    """
+
+    def __init__(self, cache_dir, config):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.config = config
+        self.key = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:32]
+        self.path = os.path.join(cache_dir, self.key)
+        self.complete = os.path.exists(self.path + '.json')
+        if self.complete:
+            counts = np.fromfile(self.path + '.counts', dtype=np.int32)
+            self.offsets = np.concatenate(([0], np.cumsum(counts)))
+            self.rows = np.memmap(self.path + '.dets', dtype=np.float32, mode='r') if self.offsets[-1] else \
+                np.empty(0, dtype=np.float32)
+            self.rows = self.rows.reshape(-1, 5)
+            self.frames = len(counts)
+        else:
+            # recorded to temporary files, only renamed into place once complete
+            self.dets_file = tempfile.NamedTemporaryFile(prefix='.dets-', dir=cache_dir, delete=False)
+            self.counts_file = tempfile.NamedTemporaryFile(prefix='.counts-', dir=cache_dir, delete=False)
+            self.frames = 0
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        return np.array(self.rows[self.offsets[index]:self.offsets[index + 1]], dtype=float)
+
+    def append(self, detections):
+        """
+        Records the (N, 5) [x1,y1,x2,y2,score] detections of the next frame.
+        """
+        detections = np.ascontiguousarray(np.asarray(detections, dtype=np.float32).reshape(-1, 5))
+        self.dets_file.write(detections.tobytes())
+        self.counts_file.write(np.int32(len(detections)).tobytes())
+        self.frames += 1
+
+    def finish(self):
+        """
+        Completes a recording that covered the whole video.
+        """
+        if self.complete:
+            return
+        self.dets_file.close()
+        self.counts_file.close()
+        os.replace(self.dets_file.name, self.path + '.dets')
+        os.replace(self.counts_file.name, self.path + '.counts')
+        _write_atomic(self.path + '.json', json.dumps(dict(self.config, frames=self.frames), indent=1).encode())
+        self.complete = True
+
+    def close(self):
+        """
+        Drops a recording that was not finished (e.g. stopped before the end of the video).
+        """
+        if self.complete:
+            return
+        for f in (self.dets_file, self.counts_file):
+            f.close()
+            os.remove(f.name)
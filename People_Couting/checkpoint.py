@@ -0,0 +1,185 @@
+import os
+import pickle
+import shutil
+import subprocess
+import tempfile
+import cv2
+
+
+def save_checkpoint(path, state):
+    """
+    Pickles `state` to `path` atomically, so a crash while saving never leaves a broken checkpoint.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.ckpt-', dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    Loads a checkpoint written by save_checkpoint, or returns None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def seek(cap, frame_index):
+    """
+    Positions a cv2.VideoCapture so the next read() returns frame `frame_index`. Falls back to
+    grabbing frames from the start when the backend cannot seek exactly.
+    """
+    if frame_index <= 0:
+        return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(frame_index):
+            if not cap.grab():
+                break
+
+
+def merge_segments(segments, output_path, fps, size, fourcc='mp4v'):
+    """
+    Joins video segments into output_path: losslessly with ffmpeg's concat demuxer when ffmpeg is
+    installed, otherwise by re-encoding the frames with cv2.VideoWriter.
+    """
+    if len(segments) == 1:
+        os.replace(segments[0], output_path)
+        return
+    if shutil.which('ffmpeg'):
+        list_path = output_path + '.segments.txt'
+        with open(list_path, 'w') as f:
+            for segment in segments:
+                f.write("file '%s'\n" % os.path.abspath(segment).replace("'", "'\\''"))
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                        '-c', 'copy', output_path], check=True)
+        os.remove(list_path)
+    else:
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        for segment in segments:
+            cap = cv2.VideoCapture(segment)
+            while True:
+                rt, frame = cap.read()
+                if not rt:
+                    break
+                out.write(frame)
+            cap.release()
+        out.release()
+    for segment in segments:
+        os.remove(segment)
+
+
+class VideoCheckpointer:
+    """
+    Periodically checkpoints a frame-by-frame video job so it can resume after a crash or kill.
+
+    The output video is written in segments: at every checkpoint the current segment is finalised
+    (an mp4 whose writer was killed is unreadable) and the checkpoint records the next frame to
+    process, the finished segments and the job's own state (tracker, counts, ...). finish() joins
+    the segments into the output file and removes the checkpoint.
+
+        ckpt = VideoCheckpointer(output_path, fps, size, every=1000, resume=True)
+        job_state = ckpt.resume_state      # None on a fresh start
+        seek(cap, ckpt.frame_index)
+        ... for each frame: ckpt.write(frame); ckpt.step(get_job_state)
+        ckpt.finish()
+    """
+
+    def __init__(self, output_path, fps, size, fourcc='mp4v', every=1000, resume=False, checkpoint_path=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.size = size
+        self.fourcc = fourcc
+        self.every = every
+        self.checkpoint_path = checkpoint_path or output_path + '.ckpt'
+
+        checkpoint = load_checkpoint(self.checkpoint_path) if resume else None
+        if checkpoint is None:
+            self.frame_index = 0
+            self.segments = []
+            self.resume_state = None
+        else:
+            self.frame_index = checkpoint['frame_index']
+            self.segments = checkpoint['segments']
+            self.resume_state = checkpoint['state']
+            print(f"Resuming from frame {self.frame_index} ({self.checkpoint_path}).")
+        self.writer = None
+        self.segment_frames = 0
+
+    def _segment_path(self, index):
+        root, ext = os.path.splitext(self.output_path)
+        return f"{root}.part{index:04d}{ext or '.mp4'}"
+
+    def _open_segment(self):
+        if self.writer is None:
+            self.current_segment = self._segment_path(len(self.segments))
+            self.writer = cv2.VideoWriter(self.current_segment, cv2.VideoWriter_fourcc(*self.fourcc), self.fps,
+                                          self.size)
+        return self.writer
+
+    def isOpened(self):
+        """
+        Opens the current segment (cv2.VideoWriter-compatible) and reports whether it can be written.
+        """
+        return self._open_segment().isOpened()
+
+    def write(self, frame):
+        """
+        Writes one output frame to the current segment.
+        """
+        self._open_segment().write(frame)
+        self.segment_frames += 1
+
+    def _close_segment(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+            if self.segment_frames:
+                self.segments.append(self.current_segment)
+            else:
+                os.remove(self.current_segment)
+            self.segment_frames = 0
+
+    def step(self, state_fn=None):
+        """
+        Marks the current frame as fully processed and checkpoints every `every` frames;
+        `state_fn()` returns the job state to store.
+        """
+        self.frame_index += 1
+        if self.every and self.frame_index % self.every == 0:
+            self.checkpoint(state_fn() if state_fn is not None else None)
+
+    def checkpoint(self, state=None):
+        """
+        Finalises the current segment and saves a checkpoint at the current frame.
+        """
+        self._close_segment()
+        save_checkpoint(self.checkpoint_path, {'frame_index': self.frame_index, 'segments': list(self.segments),
+                                               'state': state})
+
+    def finish(self):
+        """
+        Finalises the output video and removes the checkpoint.
+        """
+        self._close_segment()
+        if self.segments:
+            merge_segments(self.segments, self.output_path, self.fps, self.size, self.fourcc)
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    release = finish
+
+    def close(self):
+        """
+        Releases the writer of the current segment without finishing the video, e.g. after an error.
+        Its frames are not checkpointed yet, so it is removed; the checkpoint stays to resume from.
+        """
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+            os.remove(self.current_segment)
+            self.segment_frames = 0
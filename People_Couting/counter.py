@@ -0,0 +1,543 @@
+import numpy as np
+import cvzone
+import cv2
+import itertools
+import time
+from functools import partial
+from sort import *
+from stride import StrideController, MotionGate
+from checkpoint import VideoCheckpointer, seek
+from analytics import TrackAnalytics, CountsLog
+from pipeline import run_pipelined, batched, LatestFrameReader
+from sharding import shard_ranges, run_shards, stitch
+from roi import roi_rect, roi_fraction, roi_image_size, crop, to_frame
+from preprocess import FramePool
+from detectors import load_detector
+from resolution import ResolutionController
+from metrics import Metrics
+from cache import DetectionCache, detection_config
+
+# zone of the mall video, in the 1280x1152 frames it is processed at (see zones.json)
+DEFAULT_ZONE = np.array([
+    [343, 259], [383, 471], [195, 567], [195, 723],
+    [143, 735], [7, 399], [7, 1039], [27, 1071],
+    [907, 1075], [932, 1067], [953, 1043], [951, 27], [923, 3],
+    [847, 7], [691, 63], [699, 87], [643, 115], [623, 91], [343, 259]
+])
+
+class PeopleCounter:
+    """
+    Detects, tracks and counts the people in the zones of a video, with any detection backend of
+    detectors.py. Frames are resized to `frame_size`, the resolution the `zones` polygons (and the
+    entry/exit `lines`) are given in, which defaults to the mall video zone. A `detector` already
+    loaded (and restricted to people) is used instead of loading the backend, e.g. by the workers
+    of server.py that keep their model warm across videos. With `resolutions`, the detector input
+    size is picked among them per window of frames (see ResolutionController), for backends with a
+    variable input size. Every stage (decode, resize, detect, track, zones, annotate, write, ...)
+    is timed into `metrics` (see metrics.py; pass Metrics(enabled=False) to turn it off). With a
+    `detection_cache` directory, the detections of a video are recorded there on the first run and
+    replayed by later runs with the same video and detector configuration (see cache.py). With
+    load_model=False no detector is loaded, for a counter that only runs count_video_sharded, whose
+    workers load their own.
+    """
+
+    def __init__(self, input_video_path, output_video_path, classnames_path='classes.txt', detector_stride=1,
+                 adaptive_stride=False, checkpoint_every=0, resume=False, lines=(), headless=False, roi=False,
+                 roi_pad=64, motion_gate=False, motion_threshold=0.005, max_skip=25, backend='yolo_nas',
+                 backend_options=None, zones=None, frame_size=(1280, 1152), detector=None, resolutions=None,
+                 detect_latency=0., metrics=None, detection_cache=None, load_model=True):
+        # everything a worker process needs to set up an identical counter (see count_video_sharded)
+        self.config = dict(classnames_path=classnames_path, detector_stride=detector_stride,
+                           adaptive_stride=adaptive_stride, lines=lines, roi=roi, roi_pad=roi_pad,
+                           motion_gate=motion_gate, motion_threshold=motion_threshold, max_skip=max_skip,
+                           backend=backend, backend_options=backend_options, zones=zones, frame_size=frame_size,
+                           resolutions=resolutions, detect_latency=detect_latency)
+        self.input_video_path = input_video_path
+        self.output_video_path = output_video_path
+        self.classnames_path = classnames_path
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # a number is a camera index, anything else a file or stream URL
+        self.cap = cv2.VideoCapture(int(input_video_path) if str(input_video_path).isdigit() else input_video_path)
+        self.fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        # live sources often report no frame rate
+        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 25
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_size = tuple(frame_size)
+        # writes the output in segments and checkpoints the job every `checkpoint_every` frames (0 = never);
+        # frames are annotated after resizing, so the output has the processing size, not the source's
+        self.out = VideoCheckpointer(self.output_video_path, self.fps, self.frame_size,
+                                     every=checkpoint_every, resume=resume)
+        self.resume = resume
+        self.counts = None
+        # preallocated buffers frames are resized into, set up per run (see resize)
+        self.frames = None
+
+        # headless runs never write video, only checkpoints
+        if not headless and not self.out.isOpened():
+            print("Error: Could not open output video file for writing.")
+            exit()
+
+        with open(self.classnames_path, 'r') as f:
+            self.classnames = f.read().splitlines()
+        self.person_class = self.classnames.index('person')
+        # only people are counted: the detector drops the other classes before NMS
+        if detector is None and load_model:
+            detector = load_detector(backend, **dict(backend_options or {}, classes=[self.person_class]))
+        self.detector = detector
+
+        self.zones = [np.asarray(zone, dtype=np.int32) for zone in zones] if zones is not None else [DEFAULT_ZONE]
+
+        # detect only inside the padded bounding rectangle of the zones
+        self.roi = roi_rect(self.zones, self.frame_size, roi_pad) if roi else None
+        if self.roi is not None:
+            print(f"Detecting in ROI {self.roi} ({roi_fraction(self.roi, self.frame_size):.0%} of the frame).")
+            if hasattr(self.detector, 'imgsz'):
+                # the crop is detected at the scale full frames have instead of being blown up to the
+                # full input size; scaled from the full-frame size, a warm detector may be reused
+                full = vars(self.detector).setdefault('full_imgsz', self.detector.input_size(self.frame_size))
+                self.detector.imgsz = roi_image_size(self.roi, self.frame_size, full)
+
+        self.tracker = Sort()
+        # run the detector every `detector_stride` frames, Kalman predictions fill the gaps
+        self.stride = StrideController(detector_stride, adaptive=adaptive_stride)
+        # skip the detector on frames without motion in the zone, reusing the last detections
+        self.gate = MotionGate(motion_threshold, max_skip=max_skip, zones=self.zones) if motion_gate else None
+        # zone membership, dwell time and crossings of the entry/exit `lines` ([x1, y1, x2, y2] each)
+        self.analytics = TrackAnalytics(zones=self.zones, lines=lines, fps=self.fps, frame_size=self.frame_size)
+
+        # pick the detector input size from the scene and the latency target
+        self.resolution = None
+        if resolutions and self.detector is not None:
+            if not hasattr(self.detector, 'imgsz'):
+                raise ValueError(f"The {backend} backend has a fixed input size, it cannot use resolutions")
+            self.resolution = ResolutionController(resolutions, self.frame_size, detect_latency)
+            blank = np.zeros((self.frame_size[1], self.frame_size[0], 3), dtype=np.uint8)
+            if self.roi is not None:
+                blank = crop(blank, self.roi)
+            # kept on the detector, so a server.py worker warms each size up once for all its jobs
+            warmed = vars(self.detector).setdefault('warmed', {}).setdefault(blank.shape, {})
+            self.resolution.warm_up(lambda size: self.detect_at([blank], size), cache=warmed)
+
+        # detections of every frame, recorded by the first run and replayed by the next ones
+        self.cache = None
+        if detection_cache:
+            if self.gate is not None or self.resolution is not None:
+                raise ValueError("The detection cache needs the detections of every frame at one input size, "
+                                 "it cannot be used with the motion gate or resolutions")
+            config = detection_config(input_video_path, backend, self.detector, backend_options, self.frame_size,
+                                      self.roi, detection_cache)
+            self.cache = DetectionCache(detection_cache, config)
+            print(f"Detection cache {self.cache.path}: " + (f"replaying {len(self.cache)} frames."
+                                                            if self.cache.complete else "recording."))
+
+    def detect(self, video):
+        return self.detect_batch([video])[0]
+
+    def detect_at(self, videos, size):
+        # the ROI crop is detected at the scale full frames have at `size`
+        self.detector.imgsz = roi_image_size(self.roi, self.frame_size, size) if self.roi is not None else size
+        return self.detector.detect(videos)
+
+    def detect_batch(self, videos):
+        """
+        Runs the detector once over a list of frames and returns the (N, 5) [x1,y1,x2,y2,score]
+        person detections of each frame.
+        """
+        if self.roi is not None:
+            videos = [crop(video, self.roi) for video in videos]
+        if self.resolution is not None:
+            start = time.perf_counter()
+            detections = self.detect_at(videos, self.resolution.size)
+            seconds = (time.perf_counter() - start) / len(videos)
+            self.metrics.observe('detect', seconds * len(videos))
+        else:
+            with self.metrics.stage('detect'):
+                detections = self.detector.detect(videos)
+        detections = [d[d[:, 5] == self.person_class, :5] for d in detections]
+        if self.resolution is not None:
+            for d in detections:
+                self.resolution.observe(d, seconds)
+        if self.roi is not None:
+            detections = [to_frame(d, self.roi) for d in detections]
+        return detections
+
+    def infer(self, video):
+        return self.infer_batch([video])[0]
+
+    def resize(self, video):
+        if self.frames is not None:
+            return self.frames.resize(video)
+        return cv2.resize(video, self.frame_size)
+
+    def infer_batch(self, videos, detect=None, start=None):
+        """
+        Detects on a batch of consecutive frames with a single forward pass, then runs the tracker
+        and zone analytics on each frame in order. Returns a (video, track_result, in_zone) tuple
+        per frame. The stride decides up front which frames of the batch get detections, so an
+        adaptive stride change takes effect from the next batch. Callers that already asked the
+        stride pass its decisions as `detect`; frames without detection may then be None.
+
+        With a detection cache, `start` is the index of the first frame of the batch: a complete
+        cache provides the detections (all frames may then be None), otherwise every frame is
+        detected and recorded, and only the frames to detect are tracked with their detections.
+        """
+        if detect is None:
+            detect = [self.stride.should_detect() for _ in videos]
+        with self.metrics.stage('resize'):
+            videos = [self.resize(video) if video is not None else None for video in videos]
+        frames = [v for v, d in zip(videos, detect) if d]
+        if self.cache is not None and start is not None:
+            if self.cache.complete:
+                with self.metrics.stage('cache'):
+                    detections = iter([self.cache[start + i] for i, d in enumerate(detect) if d])
+            else:
+                recorded = self.detect_batch(videos)
+                with self.metrics.stage('cache'):
+                    for d in recorded:
+                        self.cache.append(d)
+                detections = iter([d for d, flag in zip(recorded, detect) if flag])
+        elif self.gate is not None:
+            detections = iter(self.gate.run(frames, self.detect_batch))
+        else:
+            detections = iter(self.detect_batch(frames) if frames else [])
+
+        results = []
+        for video, d in zip(videos, detect):
+            with self.metrics.stage('track'):
+                if d:
+                    track_result = self.tracker.update(next(detections))
+                    self.stride.observe(self.tracker)
+                else:
+                    track_result = self.tracker.predict()
+            with self.metrics.stage('zones'):
+                in_zone, _ = self.analytics.update(track_result)
+            results.append((video, track_result, in_zone))
+        return results
+
+    def annotate(self, video, track_result, in_zone):
+        people_count = int(np.count_nonzero(in_zone.any(axis=1)))
+
+        cv2.polylines(video, self.zones, True, (0, 0, 255), 4)
+        for a, b in zip(self.analytics.line_a.astype(int), self.analytics.line_b.astype(int)):
+            cv2.line(video, tuple(a), tuple(b), (255, 0, 255), 3)
+        for results in track_result:
+            x1, y1, x2, y2, id = results
+            x1, y1, x2, y2, id = int(x1), int(y1), int(x2), int(y2), int(id)
+            w, h = x2 - x1, y2 - y1
+            cx, cy = x1 + w // 2, y1 + h // 2
+
+            cv2.circle(video, (cx, cy), 6, (0, 255, 255), -1)
+            cv2.rectangle(video, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cvzone.putTextRect(video, f'{id}', [x1 + 8, y1 - 12], thickness=2, scale=1.5)
+
+        # Display the count of people in the region on the frame
+        cvzone.putTextRect(video, f'People in Region: {people_count}', (0, 32), scale=2)
+        cvzone.putTextRect(video, f'Total People Detected: {len(track_result)}', (600, 32), scale=2)
+
+        return video
+
+    def process_frame(self, video):
+        return self.annotate(*self.infer(video))
+
+    def state_dict(self):
+        state = {'tracker': self.tracker.state_dict(), 'stride': self.stride.state_dict(),
+                 'analytics': self.analytics.state_dict()}
+        if self.gate is not None:
+            state['gate'] = self.gate.state_dict()
+        if self.resolution is not None:
+            state['resolution'] = self.resolution.state_dict()
+        if self.counts is not None:
+            state['counts'] = self.counts.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        self.tracker.load_state_dict(state['tracker'])
+        self.stride.load_state_dict(state['stride'])
+        self.analytics.load_state_dict(state['analytics'])
+        if self.gate is not None and 'gate' in state:
+            self.gate.load_state_dict(state['gate'])
+        if self.resolution is not None and 'resolution' in state:
+            self.resolution.load_state_dict(state['resolution'])
+        if self.counts is not None and 'counts' in state:
+            self.counts.load_state_dict(state['counts'])
+
+    def read_frames(self):
+        while self.cap.isOpened():
+            with self.metrics.stage('decode'):
+                rt, video = self.cap.read()
+            if not rt:
+                print("End of video file reached or cannot read the frame.")
+                break
+            yield video
+
+    def grab_frames(self):
+        # only frames the detector runs on are decoded, tracking alone needs no pixels
+        while True:
+            with self.metrics.stage('decode'):
+                if not self.cap.grab():
+                    break
+                detect = self.stride.should_detect()
+                video = self.cap.retrieve()[1] if detect else None
+            yield video, detect
+        print("End of video file reached or cannot read the frame.")
+
+    def process_video(self, pipelined=False, queue_size=8, batch_size=1, preview=True):
+        """
+        Processes the whole video. With pipelined=True decoding, inference + tracking and
+        annotation + encoding run as separate stages connected by bounded queues of `queue_size`,
+        overlapping video I/O with model compute; the output is the same as the sequential run.
+        With batch_size > 1 the detector runs on batches of that many frames (see infer_batch).
+        With preview=False the annotated frames are only written, not shown.
+        """
+        # continue from the last checkpoint when resuming
+        if self.out.resume_state is not None:
+            self.load_state_dict(self.out.resume_state)
+        seek(self.cap, self.out.frame_index)
+        every = self.out.every
+        # resized frames stay in use until written: the batches queued, inferred and annotated
+        in_flight = (queue_size + 2 if pipelined else 1) * batch_size
+        self.frames = FramePool(self.frame_size, in_flight + 1)
+        read, ended = 0, False
+
+        def frames():
+            # counts the frames read, a detection cache recording is only complete if all were inferred
+            nonlocal read, ended
+            for video in self.read_frames():
+                read += 1
+                yield video
+            ended = True
+
+        # batches end at checkpoints so the state saved with them matches the last frame written
+        batches = batched(frames(), batch_size, every, self.out.frame_index)
+
+        inferred = self.out.frame_index
+
+        def infer(videos):
+            nonlocal inferred
+            results = self.infer_batch(videos, start=inferred)
+            inferred += len(results)
+            # snapshot the state together with its frames, the tracker may run ahead of the writer
+            state = self.state_dict() if every and inferred % every == 0 else None
+            return results, state
+
+        def output(batch):
+            results, state = batch
+            for video, track_result, in_zone in results:
+                with self.metrics.stage('annotate'):
+                    video = self.annotate(video, track_result, in_zone)
+
+                # Write the frame to the output file
+                with self.metrics.stage('write'):
+                    self.out.write(video)
+                    self.out.step(lambda: state)
+                self.metrics.frame()
+
+                # Display the frame
+                if preview:
+                    with self.metrics.stage('show'):
+                        cv2.imshow('frame', video)
+                        key = cv2.waitKey(1)
+                    if key & 0xFF == ord('q'):
+                        return False
+            return True
+
+        complete = False
+        try:
+            if pipelined:
+                run_pipelined(batches, infer, output, queue_size, self.metrics)
+            else:
+                for videos in batches:
+                    if not output(infer(videos)):
+                        break
+            complete = ended and inferred == read
+        finally:
+            # an error drops a detection cache recording too, not only stopping early
+            self.close_cache(complete)
+        self.report()
+        self.cap.release()
+        self.out.release()
+        if preview:
+            cv2.destroyAllWindows()
+
+    def count_video(self, counts_path, per_second=False, batch_size=1):
+        """
+        Headless counting: no window, drawing or video encoding, only detection, tracking and zone
+        analytics. Zone occupancy and the IDs in the zone are logged to the `counts_path` CSV once
+        per frame, or once per second with per_second=True (see CountsLog). Frames skipped by the
+        detector stride are grabbed but never decoded.
+        """
+        self.counts = CountsLog(counts_path, self.fps, self.fps if per_second else 1, resume=self.resume)
+        if self.out.resume_state is not None:
+            self.load_state_dict(self.out.resume_state)
+        seek(self.cap, self.out.frame_index)
+        self.frames = FramePool(self.frame_size, batch_size + 1)
+
+        if self.cache is None:
+            frames = self.grab_frames()
+        elif self.cache.complete:
+            # replay: nothing to decode
+            frames = ((None, self.stride.should_detect()) for _ in range(len(self.cache)))
+        else:
+            # record: every frame is detected
+            frames = ((video, self.stride.should_detect()) for video in self.read_frames())
+
+        complete = False
+        try:
+            for batch in batched(frames, batch_size, self.out.every, self.out.frame_index):
+                videos, detect = zip(*batch)
+                for _, track_result, in_zone in self.infer_batch(videos, detect, start=self.out.frame_index):
+                    with self.metrics.stage('counts'):
+                        in_zone = in_zone.any(axis=1)
+                        self.counts.add(self.out.frame_index, np.count_nonzero(in_zone), len(track_result),
+                                        track_result[in_zone, 4])
+                        self.out.step(self.state_dict)
+                    self.metrics.frame()
+            complete = True
+        finally:
+            self.close_cache(complete)
+        self.report()
+        self.counts.close()
+        self.cap.release()
+        self.out.release()
+
+    def process_stream(self, latency=0.5, replay=False, counts_path=None, per_second=False, preview=True):
+        """
+        Processes a live source (camera, RTSP stream) in real time. A reader thread keeps only the
+        newest frame (see LatestFrameReader), so when detection is slower than the source the
+        frames in between are dropped instead of queued. Frames already older than `latency`
+        seconds when they are taken are dropped too. The tracker and zone analytics still step
+        through every dropped frame by Kalman prediction, so track IDs and dwell times follow real
+        time. Annotated frames are written (and shown with preview=True), or with `counts_path`
+        only counts are logged as in count_video. With replay=True a video file is read at its own
+        frame rate, as a stand-in for a camera.
+        """
+        reader = LatestFrameReader(self.cap, self.fps if replay else 0)
+        if counts_path is not None:
+            self.counts = CountsLog(counts_path, self.fps, self.fps if per_second else 1)
+        self.frames = FramePool(self.frame_size, 2)
+        next_index, late, latencies = 0, 0, []
+        try:
+            for index, captured, video in reader:
+                self.metrics.gauge('frames_superseded', reader.superseded)
+                if time.monotonic() - captured > latency:
+                    late += 1
+                    self.metrics.gauge('frames_late', late)
+                    continue
+                # dropped frames are tracked without detection
+                gap = index - next_index
+                results = self.infer_batch([None] * gap + [video], [False] * gap + [self.stride.should_detect()])
+                if self.counts is not None:
+                    with self.metrics.stage('counts'):
+                        for i, (_, track_result, in_zone) in enumerate(results):
+                            in_zone = in_zone.any(axis=1)
+                            self.counts.add(next_index + i, np.count_nonzero(in_zone), len(track_result),
+                                            track_result[in_zone, 4])
+                else:
+                    with self.metrics.stage('annotate'):
+                        video = self.annotate(*results[-1])
+                    with self.metrics.stage('write'):
+                        self.out.write(video)
+                        self.out.step()
+                next_index = index + 1
+                latencies.append(time.monotonic() - captured)
+                self.metrics.observe('latency', latencies[-1])
+                self.metrics.frame()
+                if preview and self.counts is None:
+                    with self.metrics.stage('show'):
+                        cv2.imshow('frame', video)
+                        key = cv2.waitKey(1)
+                    if key & 0xFF == ord('q'):
+                        break
+        except KeyboardInterrupt:
+            print("Stopped.")
+        finally:
+            reader.close()
+
+        self.report()
+        latencies = np.array(latencies) * 1000
+        print(f"Stream: {reader.frames} frames read, {reader.superseded} dropped as superseded, {late} dropped "
+              f"as older than {latency * 1000:.0f} ms, {len(latencies)} processed.")
+        if len(latencies):
+            print(f"Latency: mean {latencies.mean():.0f} ms, p95 {np.percentile(latencies, 95):.0f} ms, "
+                  f"max {latencies.max():.0f} ms, {np.count_nonzero(latencies > latency * 1000)} frames over budget.")
+        if self.counts is not None:
+            self.counts.close()
+        self.cap.release()
+        self.out.release()
+        if preview and self.counts is None:
+            cv2.destroyAllWindows()
+
+    def close_cache(self, complete):
+        """
+        Completes a detection cache recording if the whole video was `complete`ly detected, or
+        drops it.
+        """
+        if self.cache is None:
+            return
+        if complete and not self.cache.complete:
+            self.cache.finish()
+            print(f"Detection cache {self.cache.path}: recorded {len(self.cache)} frames.")
+        self.cache.close()
+
+    def track_frames(self, start, stop, batch_size=1):
+        """
+        Runs detection and tracking alone over the frames [start, stop) and returns the tracker
+        output of each frame.
+        """
+        seek(self.cap, start)
+        self.frames = FramePool(self.frame_size, batch_size + 1)
+        tracks = []
+        for batch in batched(itertools.islice(self.grab_frames(), stop - start), batch_size):
+            videos, detect = zip(*batch)
+            tracks.extend(track_result for _, track_result, _ in self.infer_batch(videos, detect))
+        return tracks
+
+    def count_video_sharded(self, counts_path, shards, overlap=50, per_second=False, batch_size=1,
+                            iou_threshold=0.3):
+        """
+        Headless counting of a recorded video split into `shards` time segments tracked in parallel,
+        each in its own worker process with its own model and tracker. Consecutive segments overlap
+        by `overlap` frames, over which tracks are matched by IoU (see sharding.stitch) so IDs stay
+        consistent; zone analytics and the counts log then run over the stitched tracks.
+        """
+        num_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        ranges = shard_ranges(num_frames, shards, overlap)
+        job = partial(track_shard, self.input_video_path, self.output_video_path, self.config, batch_size)
+        results = run_shards(job, ranges, shards)
+        tracks = stitch([tracks for tracks, _ in results], ranges, iou_threshold)
+        self.stride.detected_frames = sum(detected for _, detected in results)
+
+        self.counts = CountsLog(counts_path, self.fps, self.fps if per_second else 1)
+        for index, track_result in enumerate(tracks):
+            in_zone = self.analytics.update(track_result)[0].any(axis=1)
+            self.counts.add(index, np.count_nonzero(in_zone), len(track_result), track_result[in_zone, 4])
+        self.report()
+        self.counts.close()
+        self.cap.release()
+
+    def report(self):
+        print(f"Processed {self.analytics.frame_index + 1} frames ({self.stride.detected_frames} with detection).")
+        if self.gate is not None:
+            print(f"Motion gate: detector skipped on {self.gate.skipped_frames} static frames.")
+        if self.resolution is not None:
+            sizes = ', '.join(f"{size}: {frames} frames, {self.resolution.seconds.get(size, 0) * 1000:.0f} ms"
+                              for size, frames in self.resolution.frames.items())
+            print(f"Input sizes ({self.resolution.changes} changes): {sizes}.")
+        for z in range(len(self.zones)):
+            ids, dwell = self.analytics.dwell_seconds(z)
+            name = 'region' if len(self.zones) == 1 else f'zone {z}'
+            print(f"Unique people in {name}: {len(ids)}, mean dwell time: {dwell.mean() if len(ids) else 0:.1f} s")
+        for i, (entered, exited) in enumerate(self.analytics.line_counts):
+            print(f"Line {i}: {entered} crossed in, {exited} crossed out")
+        self.metrics.report()
+        self.metrics.close()
+
+def track_shard(input_video_path, output_video_path, config, batch_size, start, stop):
+    # runs in a worker process of PeopleCounter.count_video_sharded
+    KalmanBoxTracker.count = 0
+    counter = PeopleCounter(input_video_path, output_video_path, headless=True, **config)
+    tracks = counter.track_frames(start, stop, batch_size)
+    counter.cap.release()
+    return tracks, counter.stride.detected_frames
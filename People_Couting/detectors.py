@@ -0,0 +1,333 @@
+"""
+Detection backends behind one interface.
+
+Every backend wraps a pretrained COCO model and implements Detector.detect(frames): it takes a
+list of BGR frames and returns one (N, 6) float array of [x1, y1, x2, y2, score, class] per frame,
+in frame coordinates and with COCO class ids (0 = person). With `classes`, a backend only keeps
+those class ids, and drops the others before NMS rather than after, so the time NMS and the
+conversion of the results take depends on the number of people only. The deep learning
+frameworks are only imported when their backend is created, so only the one in use has to be
+installed.
+
+    detector = load_detector('yolov8', model='yolov8s.pt', conf=0.5, classes=[0])
+    detections = detector.detect([frame])[0]
+"""
+import numpy as np
+import cv2
+
+
+def as_detections(xyxy, scores, classes):
+    """
+    Stacks boxes, scores and class ids into the (N, 6) detections array.
+    """
+    return np.concatenate((np.asarray(xyxy, dtype=float).reshape(-1, 4),
+                           np.asarray(scores, dtype=float).reshape(-1, 1),
+                           np.asarray(classes, dtype=float).reshape(-1, 1)), axis=1)
+
+
+class Detector:
+    """
+    Base class of the detection backends. Backends whose input size can change between calls
+    have an `imgsz` attribute (the longest side of the model input, in pixels) that can be set.
+    """
+
+    def detect(self, frames):
+        raise NotImplementedError
+
+    def input_size(self, frame_size):
+        """
+        Returns the longest side of the model input for a (width, height) frame, for backends with
+        an `imgsz`.
+        """
+        return self.imgsz
+
+
+def cached_letterbox(letterboxes, frames, imgsz, tensor=False):
+    """
+    Returns the Letterbox of the frames' size at `imgsz` from the `letterboxes` dict, creating it
+    (and its input buffer) the first time that size is seen.
+    """
+    from preprocess import Letterbox
+
+    height, width = frames[0].shape[:2]
+    key = width, height, imgsz
+    if key not in letterboxes:
+        letterboxes[key] = Letterbox((width, height), imgsz, max_batch=len(frames), tensor=tensor)
+    return letterboxes[key]
+
+
+def yolo_nas_classes_callback(get_callback, classes):
+    """
+    Wraps a YOLO-NAS model's get_post_prediction_callback so that the NMS of the callbacks it
+    returns only sees the scores of `classes`: the other classes are dropped before the confidence
+    threshold and NMS instead of being decoded, suppressed and filtered out afterwards. This hooks
+    a private method of super-gradients' PPYoloEPostPredictionCallback; if the installed version
+    has no such callback or method, `get_callback` is returned unchanged and the classes have to be
+    filtered after NMS.
+    """
+    import torch
+    try:
+        from super_gradients.training.models.detection_models.pp_yolo_e.post_prediction_callback import \
+            PPYoloEPostPredictionCallback
+    except ImportError:
+        return get_callback
+    if not hasattr(PPYoloEPostPredictionCallback, '_get_decoded_predictions_from_model_output'):
+        return get_callback
+
+    keep = torch.as_tensor(list(classes))
+
+    class ClassesCallback(PPYoloEPostPredictionCallback):
+        def _get_decoded_predictions_from_model_output(self, outputs):
+            boxes, scores = super()._get_decoded_predictions_from_model_output(outputs)
+            return boxes, scores[..., keep.to(scores.device)]
+
+        def forward(self, *args, **kwargs):
+            # labels index the kept classes, map them back to class ids
+            return [torch.cat((d[:, :5], keep.to(d.device)[d[:, 5].long()].to(d.dtype).unsqueeze(1)), dim=1)
+                    for d in super().forward(*args, **kwargs)]
+
+    def get_post_prediction_callback(**kwargs):
+        # the model builds the callback with whatever options this version has, only its class changes
+        callback = get_callback(**kwargs)
+        if type(callback) is PPYoloEPostPredictionCallback:
+            callback.__class__ = ClassesCallback
+        return callback
+
+    return get_post_prediction_callback
+
+
+def restrict_detectron2_classes(model, classes):
+    """
+    Makes a Detectron2 R-CNN keep only `classes`: the box head's probabilities of the other classes
+    are zeroed, so they fail the score threshold and never reach the per-class NMS.
+    """
+    import torch
+
+    box_predictor = model.roi_heads.box_predictor
+    predict_probs = box_predictor.predict_probs
+    drop = torch.ones(box_predictor.num_classes + 1, dtype=torch.bool)
+    drop[list(classes)] = False
+    drop[-1] = False  # background
+
+    def restricted_probs(predictions, proposals):
+        return [probs.masked_fill(drop.to(probs.device), 0) for probs in predict_probs(predictions, proposals)]
+
+    box_predictor.predict_probs = restricted_probs
+
+
+class YoloNasDetector(Detector):
+    def __init__(self, model='yolo_nas_s', conf=0.5, classes=None):
+        import torch
+        from super_gradients.training import models
+
+        self.device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+        print(self.device)
+        self.model = models.get(model, pretrained_weights='coco').to(self.device)
+        get_callback = getattr(self.model, 'get_post_prediction_callback', None)
+        if classes is not None and get_callback is not None:
+            self.model.get_post_prediction_callback = yolo_nas_classes_callback(get_callback, classes)
+        self.classes = np.asarray(classes) if classes is not None else None
+        self.conf = conf
+
+    def detect(self, frames):
+        detections = [as_detections(result.prediction.bboxes_xyxy, result.prediction.confidence,
+                                    result.prediction.labels)
+                      for result in self.model.predict(list(frames), conf=self.conf)]
+        if self.classes is not None:
+            # nothing to drop when the callback kept the classes before NMS, see yolo_nas_classes_callback
+            detections = [d[np.isin(d[:, 5], self.classes)] for d in detections]
+        return detections
+
+
+class YoloV5Detector(Detector):
+    def __init__(self, model='yolov5x6', conf=0.5, size=1280, classes=None):
+        import torch
+
+        self.model = torch.hub.load('ultralytics/yolov5', model)
+        self.model.conf = conf
+        self.model.classes = classes
+        self.imgsz = size
+
+    def detect(self, frames):
+        # the hub model expects RGB images
+        results = self.model([frame[..., ::-1] for frame in frames], size=self.imgsz)
+        return [as_detections(pred[:, :4].cpu().numpy(), pred[:, 4].cpu().numpy(), pred[:, 5].cpu().numpy())
+                for pred in results.xyxy]
+
+
+class YoloV8Detector(Detector):
+    """
+    Runs an ultralytics YOLOv8 model. With `preallocate`, frames are letterboxed into reused input
+    buffers (see preprocess.Letterbox) and the model gets a tensor, skipping its own preprocessing.
+    """
+
+    def __init__(self, model='yolov8s.pt', conf=0.5, imgsz=1280, classes=None, preallocate=False):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model)
+        self.conf = conf
+        self.imgsz = imgsz
+        self.classes = classes
+        self.preallocate = preallocate
+        self.letterboxes = {}
+
+    def detect(self, frames):
+        frames = list(frames)
+        if not frames:
+            return []
+        if not self.preallocate:
+            results = self.model(frames, imgsz=self.imgsz, conf=self.conf, classes=self.classes, verbose=False)
+            return [as_detections(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(),
+                                  r.boxes.cls.cpu().numpy())
+                    for r in results]
+        letterbox = cached_letterbox(self.letterboxes, frames, self.imgsz, tensor=True)
+        results = self.model(letterbox(frames), imgsz=list(letterbox.shape), conf=self.conf, classes=self.classes,
+                             verbose=False)
+        return [as_detections(letterbox.to_frame(r.boxes.xyxy.cpu().numpy()), r.boxes.conf.cpu().numpy(),
+                              r.boxes.cls.cpu().numpy())
+                for r in results]
+
+
+class Detectron2Detector(Detector):
+    """
+    Runs a Detectron2 model zoo R-CNN. Frames are resized as the config says (shortest side
+    INPUT.MIN_SIZE_TEST, longest at most INPUT.MAX_SIZE_TEST) unless `imgsz` is set, in which
+    case their longest side is resized to `imgsz`.
+    """
+
+    def __init__(self, model='COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml', conf=0.5, classes=None,
+                 imgsz=None):
+        import torch
+        from detectron2 import model_zoo
+        from detectron2.config import get_cfg
+        from detectron2.engine import DefaultPredictor
+        import detectron2.data.transforms as T
+
+        self.torch = torch
+        self.T = T
+        self.imgsz = imgsz
+        cfg = get_cfg()
+        cfg.merge_from_file(model_zoo.get_config_file(model))
+        cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = conf
+        cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(model)
+        # only boxes are used: skip the mask head (the box head and its weights are unchanged)
+        cfg.MODEL.MASK_ON = False
+        self.predictor = DefaultPredictor(cfg)
+        if classes is not None:
+            restrict_detectron2_classes(self.predictor.model, classes)
+
+    def input_size(self, frame_size):
+        if self.imgsz is not None:
+            return self.imgsz
+        cfg = self.predictor.cfg
+        scale = min(cfg.INPUT.MIN_SIZE_TEST / float(min(frame_size)), cfg.INPUT.MAX_SIZE_TEST / float(max(frame_size)))
+        return int(round(max(frame_size) * scale))
+
+    def transform(self, image):
+        if self.imgsz is None:
+            return self.predictor.aug.get_transform(image)
+        height, width = image.shape[:2]
+        short = int(round(min(height, width) * self.imgsz / float(max(height, width))))
+        return self.T.ResizeShortestEdge([short, short], self.imgsz).get_transform(image)
+
+    def detect(self, frames):
+        # DefaultPredictor.__call__ for a whole batch: one forward pass over all frames
+        inputs = []
+        for frame in frames:
+            image = frame[:, :, ::-1] if self.predictor.input_format == 'RGB' else frame
+            image = self.transform(image).apply_image(image)
+            inputs.append({'image': self.torch.as_tensor(image.astype('float32').transpose(2, 0, 1)),
+                           'height': frame.shape[0], 'width': frame.shape[1]})
+        with self.torch.no_grad():
+            outputs = self.predictor.model(inputs)
+        detections = []
+        for output in outputs:
+            instances = output['instances'].to('cpu')
+            detections.append(as_detections(instances.pred_boxes.tensor.numpy(), instances.scores.numpy(),
+                                            instances.pred_classes.numpy()))
+        return detections
+
+
+class OnnxDetector(Detector):
+    """
+    Runs a YOLOv8 or YOLO-NAS model exported to ONNX (see quantize.py, FP32 or INT8) with ONNX
+    Runtime on the CPU. Frames are letterboxed to `imgsz` and the raw outputs decoded and filtered
+    by NMS here: a single (B, 4 + classes, N) output of centre/size boxes is the ultralytics layout,
+    (B, N, 4) corner boxes followed by (B, N, classes) scores the YOLO-NAS one.
+    """
+
+    def __init__(self, model='yolov8s_int8.onnx', conf=0.5, iou=0.7, imgsz=1280, threads=0, classes=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.classes = np.asarray(classes) if classes is not None else None
+        # one Letterbox (and input buffer) per frame and input size seen, normally just one
+        self.letterboxes = {}
+
+    def detect(self, frames):
+        frames = list(frames)
+        if not frames:
+            return []
+        letterbox = cached_letterbox(self.letterboxes, frames, self.imgsz)
+        letterbox(frames)
+        outputs = self.session.run(None, {self.input_name: letterbox.array[:len(frames)]})
+        if len(outputs) == 1:
+            # (4 + classes, N) per image: transposed views, boxes are only decoded once filtered
+            images = [(p[:4].T, p[4:].T) for p in outputs[0]]
+        else:
+            images = zip(outputs[0], outputs[1])
+        centred = len(outputs) == 1
+        height, width = frames[0].shape[:2]
+        detections = []
+        for boxes, class_scores in images:
+            d = letterbox.to_frame(self.nms(boxes, class_scores, centred))
+            d[:, [0, 2]] = d[:, [0, 2]].clip(0, width)
+            d[:, [1, 3]] = d[:, [1, 3]].clip(0, height)
+            detections.append(d)
+        return detections
+
+    def nms(self, boxes, class_scores, centred=False):
+        """
+        Keeps the best class of every box if it passes the confidence threshold (and is one of
+        `classes`), then runs per-class NMS. `centred` boxes are [cx, cy, w, h], others [x1, y1, x2, y2].
+        """
+        classes = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(classes)), classes]
+        keep = scores >= self.conf
+        if self.classes is not None:
+            keep &= np.isin(classes, self.classes)
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+        if centred:
+            boxes = np.concatenate((boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2), axis=1)
+        if len(boxes) == 0:
+            return as_detections(boxes, scores, classes)
+        # offset the boxes of each class so one NMS pass never suppresses across classes
+        offset = classes[:, None] * (boxes[:, 2:].max() + 1)
+        rects = np.concatenate((boxes[:, :2] + offset, boxes[:, 2:] - boxes[:, :2]), axis=1)
+        keep = np.asarray(cv2.dnn.NMSBoxes(rects.tolist(), scores.tolist(), self.conf, self.iou), dtype=int).ravel()
+        return as_detections(boxes[keep], scores[keep], classes[keep])
+
+
+BACKENDS = {
+    'yolo_nas': YoloNasDetector,
+    'yolov5': YoloV5Detector,
+    'yolov8': YoloV8Detector,
+    'detectron2': Detectron2Detector,
+    'onnx': OnnxDetector,
+}
+
+
+def load_detector(backend, **options):
+    """
+    Creates the detector of a backend in BACKENDS; `options` go to its constructor (model, conf, ...).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', choose from {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[backend](**options)
@@ -0,0 +1,241 @@
+"""
+Lightweight per-stage instrumentation of the counting pipeline: latency histograms of the stages
+(decode, detect, track, zones, annotate, write, ...), gauges such as queue depths, and the frame
+rate. Metrics can be appended to a JSON lines file and served in the Prometheus text format on a
+local HTTP endpoint. Timing a stage costs two perf_counter calls and a bisect, so it can stay on
+in production; Metrics(enabled=False) turns every call into a no-op.
+
+    metrics = Metrics()
+    with metrics.stage('detect'):
+        detections = detector.detect(frames)
+    metrics.gauge('queue_decoded', q.qsize())
+    metrics.frame()
+    serve_metrics(metrics, 9100)  # GET http://127.0.0.1:9100/metrics
+"""
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5.)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q-quantile (inf past the last bucket).
+        """
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class _StageTimer:
+    # reused for every `with metrics.stage(name)`: a stage is timed by one thread at a time
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Collects stage latencies, gauges and the number of frames processed. With a `log_path`,
+    frame() appends a snapshot() to that JSON lines file every `log_every` seconds (and close()
+    a last one).
+    """
+
+    def __init__(self, enabled=True, log_path=None, log_every=10., prefix='people_counter'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.histograms = {}
+        self.timers = {}
+        self.gauges = {}
+        self.frames = 0
+        # the frame rate is measured from the first frame, not from model loading
+        self.start = None
+        self.log = open(log_path, 'a') if enabled and log_path else None
+        self.log_every = log_every
+        self.logged = time.monotonic()
+
+    def stage(self, name):
+        """
+        Returns a context manager timing one run of the stage `name`.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _StageTimer(self.histograms.setdefault(name, Histogram()))
+        return timer
+
+    def observe(self, name, seconds):
+        """
+        Records a latency measured by the caller (e.g. the end-to-end latency of a live frame).
+        """
+        if self.enabled:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def frame(self, count=1):
+        """
+        Counts processed frames, and writes the JSON lines log when it is due.
+        """
+        if not self.enabled:
+            return
+        if self.start is None:
+            self.start = time.time()
+        self.frames += count
+        if self.log is not None and time.monotonic() - self.logged >= self.log_every:
+            self.write_log()
+
+    def fps(self):
+        return self.frames / max(time.time() - self.start, 1e-9) if self.start is not None else 0.
+
+    def snapshot(self):
+        """
+        Returns the current metrics as a JSON-serialisable dict; latencies are in milliseconds,
+        quantiles are bucket upper bounds.
+        """
+        def ms(seconds):
+            # None past the last bucket, JSON has no infinity
+            return seconds * 1000 if seconds != float('inf') else None
+
+        stages = {}
+        for name, h in list(self.histograms.items()):
+            stages[name] = {'count': h.count, 'total_s': round(h.sum, 6),
+                            'mean_ms': round(h.sum / h.count * 1000, 3) if h.count else 0.,
+                            'p50_ms': ms(h.quantile(0.5)), 'p95_ms': ms(h.quantile(0.95))}
+        return {'time': time.time(), 'frames': self.frames, 'fps': round(self.fps(), 3), 'stages': stages,
+                'gauges': dict(self.gauges)}
+
+    def write_log(self):
+        self.logged = time.monotonic()
+        self.log.write(json.dumps(self.snapshot()) + '\n')
+        self.log.flush()
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        p = self.prefix
+        lines = [f'# TYPE {p}_frames_total counter', f'{p}_frames_total {self.frames}',
+                 f'# TYPE {p}_fps gauge', f'{p}_fps {self.fps():.3f}',
+                 f'# TYPE {p}_stage_seconds histogram']
+        for name, h in list(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {h.count}')
+        for name, value in list(self.gauges.items()):
+            lines += [f'# TYPE {p}_{name} gauge', f'{p}_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """
+        Prints the time spent in each stage, slowest first.
+        """
+        if not self.enabled or not self.histograms:
+            return
+        total = sum(h.sum for h in self.histograms.values())
+        print(f"Stages ({self.frames} frames, {self.fps():.1f} fps):")
+        for name, h in sorted(self.histograms.items(), key=lambda item: -item[1].sum):
+            print(f"  {name:10} {h.count:7} calls, mean {h.sum / max(h.count, 1) * 1000:8.2f} ms, "
+                  f"p95 <= {h.quantile(0.95) * 1000:g} ms, {h.sum / max(total, 1e-9):6.1%} of the time")
+
+    def close(self):
+        if self.log is not None:
+            self.write_log()
+            self.log.close()
+            self.log = None
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    """
+    Serves metrics.prometheus() at http://host:port/metrics (and metrics.snapshot() as JSON at
+    /metrics.json) from a daemon thread. Returns the server; call shutdown() to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = metrics.prometheus(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(metrics.snapshot()), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            body = body.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    """
+    Adds the metrics command line options to an argparse parser.
+    """
+    parser.add_argument('--no-metrics', action='store_true', help='Turn off the per-stage timing instrumentation')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (0 = off)')
+    parser.add_argument('--metrics-log', help='Append a JSON line of metrics to this file every --metrics-every s')
+    parser.add_argument('--metrics-every', type=float, default=10., help='Seconds between metrics log lines')
+
+
+def from_args(args):
+    """
+    Creates the Metrics described by the options of add_arguments and starts its endpoint.
+    """
+    metrics = Metrics(not args.no_metrics, args.metrics_log, args.metrics_every)
+    if metrics.enabled and args.metrics_port:
+        serve_metrics(metrics, args.metrics_port)
+    return metrics
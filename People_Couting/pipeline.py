@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+
+_END = object()
+
+
+def batched(iterable, size, every=0, start=0):
+    """
+    Groups the items of an iterable into lists of up to `size` items. With `every`, a batch also
+    ends after each multiple of `every` items (counted from `start`), so checkpoints taken every
+    `every` frames always fall on batch boundaries.
+    """
+    batch = []
+    index = start
+    for item in iterable:
+        batch.append(item)
+        index += 1
+        if len(batch) >= size or (every and index % every == 0):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _put(q, item, stop):
+    # blocks while the queue is full (backpressure) but gives up once the pipeline is stopping
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return _END
+
+
+def run_pipelined(source, stage, sink, queue_size=8, metrics=None):
+    """
+    Runs a three-stage pipeline: items are pulled from the `source` iterable in a decoder thread,
+    transformed by `stage(item)` in a worker thread and handed to `sink(result)` in the calling
+    thread (which keeps GUI calls such as cv2.imshow on the main thread).
+
+    Stages are connected by bounded queues of `queue_size`, so a slow stage throttles the ones
+    before it, and every stage is a single thread, so order is preserved. The sink returns False to
+    stop early. Exceptions raised in any stage stop the pipeline and are re-raised here. With
+    `metrics` (see metrics.py), the depth of both queues is recorded as gauges.
+
+    Returns the number of items the sink consumed.
+    """
+    decoded = queue.Queue(maxsize=queue_size)
+    processed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def decode():
+        try:
+            for item in source:
+                if not _put(decoded, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(decoded, _END, stop)
+
+    def work():
+        try:
+            while True:
+                item = _get(decoded, stop)
+                if item is _END:
+                    return
+                if metrics is not None:
+                    metrics.gauge('queue_decoded', decoded.qsize())
+                if not _put(processed, stage(item), stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(processed, _END, stop)
+
+    threads = [threading.Thread(target=decode, name='decode', daemon=True),
+               threading.Thread(target=work, name='inference', daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    count = 0
+    try:
+        while True:
+            result = _get(processed, stop)
+            if result is _END:
+                break
+            if metrics is not None:
+                metrics.gauge('queue_processed', processed.qsize())
+            count += 1
+            if sink(result) is False:
+                break
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return count
+
+
+class LatestFrameReader:
+    """
+    Reads a live source (a cv2.VideoCapture of an RTSP stream, a camera, ...) in a background
+    thread that always keeps only the newest frame. A frame not taken by read() before the next
+    one arrives is dropped (counted in `superseded`), so a consumer that falls behind skips ahead
+    to the present instead of working through a growing backlog.
+
+    Frames come as (index, captured, frame) tuples: `index` counts all frames read from the source,
+    so gaps show how many were dropped, and `captured` is the time.monotonic() the frame was read.
+    With `replay_fps` the source is read at no more than that rate, which turns a video file into
+    a stand-in camera; `captured` is then the time the frame was due, so a reader that cannot keep
+    up with the file's rate shows as latency too.
+    """
+
+    def __init__(self, cap, replay_fps=0):
+        self.cap = cap
+        self.replay_fps = replay_fps
+        self.condition = threading.Condition()
+        self.latest = None
+        self.finished = False
+        self.error = None
+        self.frames = 0
+        self.superseded = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._read, name='reader', daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        start = time.monotonic()
+        try:
+            while not self.stop.is_set():
+                due = start + self.frames / self.replay_fps if self.replay_fps else None
+                if due is not None and due > time.monotonic():
+                    time.sleep(due - time.monotonic())
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                with self.condition:
+                    if self.latest is not None:
+                        self.superseded += 1
+                    self.latest = (self.frames, due if due is not None else time.monotonic(), frame)
+                    self.frames += 1
+                    self.condition.notify()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    def read(self):
+        """
+        Waits for a frame newer than the last one read and returns it, or None once the source
+        has ended.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.finished)
+            if self.error is not None:
+                raise self.error
+            item, self.latest = self.latest, None
+            return item
+
+    def __iter__(self):
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self.stop.set()
+        # a blocked read of a stalled stream cannot be interrupted; the thread is a daemon
+        self.thread.join(timeout=1)
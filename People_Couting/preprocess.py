@@ -0,0 +1,77 @@
+import numpy as np
+import cv2
+
+
+class FramePool:
+    """
+    Ring of `count` preallocated frames of one (width, height) size that frames are resized into
+    (cv2.resize with dst=), so resizing a stream allocates nothing per frame. A buffer is handed out
+    again `count` frames later, so `count` has to exceed the number of resized frames in flight
+    (queued, being annotated, ...) at any time.
+    """
+
+    def __init__(self, size, count=2):
+        self.size = tuple(size)
+        self.buffers = np.empty((max(1, count), self.size[1], self.size[0], 3), dtype=np.uint8)
+        self.index = 0
+
+    def resize(self, frame):
+        buffer = self.buffers[self.index]
+        self.index = (self.index + 1) % len(self.buffers)
+        return cv2.resize(frame, self.size, dst=buffer)
+
+
+class Letterbox:
+    """
+    Letterboxes the frames of one stream into preallocated model input buffers.
+
+    The transform is computed once from the stream's (width, height) frame size: frames are scaled
+    to fit `image_size` and padded (grey 114, centred, as ultralytics does) up to the next multiple
+    of `stride` on each side. __call__ resizes a batch into a reused uint8 canvas and converts it
+    into a float32 NCHW RGB buffer in [0, 1], `array`, and returns a view of it. With `tensor`, the
+    buffer is allocated by torch (pinned when CUDA is available, for faster copies to the GPU) and
+    __call__ returns a torch view, so a model that accepts tensors skips its own resize, letterbox
+    and normalisation; torch is only imported then. to_frame() maps the boxes back.
+    """
+
+    def __init__(self, frame_size, image_size=1280, stride=32, max_batch=1, tensor=False):
+        width, height = frame_size
+        self.scale = min(image_size / float(width), image_size / float(height))
+        self.resized_size = (int(round(width * self.scale)), int(round(height * self.scale)))
+        self.shape = tuple(int(np.ceil(s / float(stride)) * stride) for s in self.resized_size[::-1])
+        self.pad = ((self.shape[1] - self.resized_size[0]) // 2, (self.shape[0] - self.resized_size[1]) // 2)
+
+        self.canvas = np.full(self.shape + (3,), 114, dtype=np.uint8)
+        x, y = self.pad
+        self.inner = self.canvas[y:y + self.resized_size[1], x:x + self.resized_size[0]]
+        self.tensor = None
+        self._allocate(max_batch, tensor)
+
+    def _allocate(self, batch, tensor):
+        if tensor:
+            import torch
+
+            self.tensor = torch.empty((batch, 3) + self.shape, dtype=torch.float32,
+                                      pin_memory=torch.cuda.is_available())
+            self.array = self.tensor.numpy()
+        else:
+            self.array = np.empty((batch, 3) + self.shape, dtype=np.float32)
+
+    def __call__(self, frames):
+        if len(frames) > len(self.array):
+            self._allocate(len(frames), self.tensor is not None)
+        rgb = self.canvas[..., ::-1].transpose(2, 0, 1)
+        for i, frame in enumerate(frames):
+            cv2.resize(frame, self.resized_size, dst=self.inner, interpolation=cv2.INTER_LINEAR)
+            np.multiply(rgb, np.float32(1 / 255.), out=self.array[i], dtype=np.float32, casting='unsafe')
+        return (self.tensor if self.tensor is not None else self.array)[:len(frames)]
+
+    def to_frame(self, boxes):
+        """
+        Maps [x1,y1,x2,y2,...] boxes from model input back to frame coordinates.
+        """
+        boxes = np.array(boxes, dtype=float, ndmin=2)
+        boxes[:, [0, 2]] -= self.pad[0]
+        boxes[:, [1, 3]] -= self.pad[1]
+        boxes[:, :4] /= self.scale
+        return boxes
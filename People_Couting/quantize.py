@@ -0,0 +1,266 @@
+"""
+INT8 models for CPU-only counting nodes: exports the YOLOv8 (ultralytics) and YOLO-NAS
+(super-gradients) person detectors to ONNX, quantizes them statically to INT8 with calibration
+frames from our own footage and checks how far the zone counts of the INT8 model drift from the
+FP32 one on a reference clip. The models then run with ONNX Runtime through the 'onnx' backend.
+
+    python quantize.py export --source yolov8 --model yolov8s.pt -o yolov8s.onnx
+    python quantize.py quantize yolov8s.onnx yolov8s_int8.onnx --calibration video.mp4 --frames 200
+    python quantize.py compare yolov8s.onnx yolov8s_int8.onnx -i clip.mp4 --zones zones.json
+    python runner.py --backend onnx --model yolov8s_int8.onnx -i video.mp4 --headless
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import cv2
+from analytics import ZoneIndex
+from detectors import OnnxDetector
+from zones import load_zones
+
+
+def export_yolov8(model, output, frame_size=(1280, 1152), imgsz=1280, opset=17):
+    """
+    Exports an ultralytics model to ONNX with dynamic batch and image size. The default input shape
+    is that of letterboxed `frame_size` frames.
+    """
+    from ultralytics import YOLO
+    from preprocess import Letterbox
+
+    shape = Letterbox(frame_size, imgsz).shape
+    path = YOLO(model).export(format='onnx', imgsz=list(shape), dynamic=True, simplify=True, opset=opset)
+    shutil.move(path, output)
+    return output
+
+
+def export_yolo_nas(model, output, frame_size=(1280, 1152), imgsz=1280, opset=17):
+    """
+    Exports a super-gradients YOLO-NAS model to ONNX with dynamic batch and image size. The graph
+    ends at the decoded (B, N, 4) boxes and (B, N, 80) class scores; NMS runs in OnnxDetector.
+    """
+    import torch
+    from super_gradients.training import models
+    from preprocess import Letterbox
+
+    class Decoded(torch.nn.Module):
+        # keeps only the decoded predictions of the model's (decoded, raw) outputs
+        def __init__(self, net):
+            super().__init__()
+            self.net = net
+
+        def forward(self, images):
+            boxes, scores = self.net(images)[0]
+            return boxes, scores
+
+    shape = Letterbox(frame_size, imgsz).shape
+    net = models.get(model, pretrained_weights='coco').eval()
+    net.prep_model_for_conversion(input_size=(1, 3) + shape)
+    dynamic = {0: 'batch', 2: 'height', 3: 'width'}
+    torch.onnx.export(Decoded(net), torch.zeros((1, 3) + shape), output, opset_version=opset,
+                      input_names=['images'], output_names=['boxes', 'scores'],
+                      dynamic_axes={'images': dynamic, 'boxes': {0: 'batch'}, 'scores': {0: 'batch'}})
+    return output
+
+
+EXPORTERS = {
+    'yolov8': export_yolov8,
+    'yolo_nas': export_yolo_nas,
+}
+
+
+def sample_frames(video_paths, count, frame_size):
+    """
+    Yields `count` frames spread evenly over the videos, resized to `frame_size` as PeopleCounter
+    does. Frames in between are grabbed but not decoded.
+    """
+    per_video = [count // len(video_paths) + (i < count % len(video_paths)) for i in range(len(video_paths))]
+    for path, n in zip(video_paths, per_video):
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        wanted = set(np.linspace(0, max(total - 1, 0), n).round().astype(int).tolist())
+        for index in range(total):
+            if not cap.grab():
+                break
+            if index in wanted:
+                ok, frame = cap.retrieve()
+                if ok:
+                    yield cv2.resize(frame, tuple(frame_size))
+        cap.release()
+
+
+def calibration_reader(model, video_paths, count=100, frame_size=(1280, 1152), imgsz=1280):
+    """
+    Returns an ONNX Runtime CalibrationDataReader feeding `count` frames of our footage to the
+    model, preprocessed exactly as OnnxDetector does at inference.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader
+    from preprocess import Letterbox
+
+    input_name = onnx.load(model, load_external_data=False).graph.input[0].name
+    letterbox = Letterbox(frame_size, imgsz)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = sample_frames(video_paths, count, frame_size)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            if frame is None:
+                return None
+            return {input_name: letterbox([frame]).copy()}
+
+        def rewind(self):
+            self.frames = sample_frames(video_paths, count, frame_size)
+
+    return Reader()
+
+
+def decoder_nodes(model):
+    """
+    Returns the names of the nodes between the last convolutions and the graph outputs of an ONNX
+    model: the box decoding, anchor generation and score concatenation. Their tensors mix pixel
+    coordinates with [0, 1] scores, which a single 8-bit scale cannot represent, so they stay FP32.
+    """
+    import onnx
+
+    graph = onnx.load(model).graph
+    producers = {output: node for node in graph.node for output in node.output}
+    names, tensors = set(), [output.name for output in graph.output]
+    while tensors:
+        node = producers.get(tensors.pop())
+        if node is None or node.name in names or node.op_type == 'Conv':
+            continue
+        names.add(node.name)
+        tensors.extend(node.input)
+    return sorted(names)
+
+
+def quantize(model, output, video_paths, count=100, frame_size=(1280, 1152), imgsz=1280, method='minmax',
+             conv_only=False):
+    """
+    Statically quantizes an FP32 ONNX model to INT8 (QDQ format, per-channel int8 weights, uint8
+    activations) with activation ranges calibrated on `count` frames of the videos.
+
+    The whole network except its decoder_nodes is quantized. With conv_only, only the convolutions
+    are: they do most of the compute, but the activations between them stay FP32. This is slower
+    and can be tried when the zone counts drift too much.
+    """
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    methods = {'minmax': CalibrationMethod.MinMax, 'entropy': CalibrationMethod.Entropy,
+               'percentile': CalibrationMethod.Percentile}
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, 'prepared.onnx')
+        # fold constants and fuse Conv+BatchNorm etc. before choosing what to quantize
+        quant_pre_process(model, prepared, skip_symbolic_shape=True)
+        quantize_static(prepared, output, calibration_reader(prepared, video_paths, count, frame_size, imgsz),
+                        quant_format=QuantFormat.QDQ, op_types_to_quantize=['Conv'] if conv_only else None,
+                        nodes_to_exclude=decoder_nodes(prepared), per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=methods[method])
+    return output
+
+
+def zone_counts(detector, video_path, zones, frame_size=(1280, 1152), person_class=0, max_frames=0):
+    """
+    Runs a detector over a video and returns the per-frame number of person detections whose box
+    centre lies in each zone, as a (frames, zones) array, along with the mean detection time per
+    frame in seconds. Counts are taken straight from the detections, without tracking, so they
+    show the detector's own drift.
+    """
+    index = ZoneIndex(zones, frame_size)
+    cap = cv2.VideoCapture(video_path)
+    counts, seconds = [], 0.
+    while not max_frames or len(counts) < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frame = cv2.resize(frame, tuple(frame_size))
+        start = time.perf_counter()
+        d = detector.detect([frame])[0]
+        seconds += time.perf_counter() - start
+        d = d[d[:, 5] == person_class]
+        centres = np.stack(((d[:, 0] + d[:, 2]) / 2, (d[:, 1] + d[:, 3]) / 2), axis=1)
+        counts.append(np.count_nonzero(index.lookup(centres), axis=0))
+    cap.release()
+    return np.array(counts, dtype=int).reshape(-1, len(zones)), seconds / max(len(counts), 1)
+
+
+def compare(reference, candidate, video_path, zones, names, frame_size=(1280, 1152), conf=0.5, imgsz=1280,
+            max_frames=0):
+    """
+    Counts the people in the zones of a reference clip with two ONNX models (normally FP32 and
+    its INT8 version) and prints how far the candidate's counts drift from the reference's.
+    Returns the mean absolute drift per frame, over all zones.
+    """
+    results = []
+    for model in (reference, candidate):
+        detector = OnnxDetector(model, conf=conf, imgsz=imgsz)
+        results.append(zone_counts(detector, video_path, zones, frame_size, max_frames=max_frames))
+    (a, a_time), (b, b_time) = results
+    drift = b - a
+    print(f"{len(a)} frames, {a_time * 1000:.1f} ms/frame FP32 reference vs {b_time * 1000:.1f} ms/frame candidate "
+          f"({a_time / max(b_time, 1e-9):.2f}x)")
+    for z, name in enumerate(names):
+        print(f"{name}: mean count {a[:, z].mean():.2f} -> {b[:, z].mean():.2f}, "
+              f"mean |drift| {np.abs(drift[:, z]).mean():.3f}, max |drift| {np.abs(drift[:, z]).max(initial=0)}, "
+              f"identical on {np.mean(drift[:, z] == 0):.1%} of frames")
+    return float(np.abs(drift).mean()) if drift.size else 0.
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Export, INT8-quantize and check ONNX person detectors')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Export a YOLOv8 or YOLO-NAS model to FP32 ONNX')
+    export.add_argument('--source', choices=sorted(EXPORTERS), default='yolov8')
+    export.add_argument('--model', default='yolov8s.pt', help='ultralytics weights or super-gradients model name')
+    export.add_argument('-o', '--output', default='yolov8s.onnx')
+
+    quant = commands.add_parser('quantize', help='Quantize an FP32 ONNX model to INT8')
+    quant.add_argument('model', help='FP32 ONNX model')
+    quant.add_argument('output', help='INT8 ONNX model to write')
+    quant.add_argument('--calibration', action='append', required=True, metavar='VIDEO',
+                       help='Video to take calibration frames from (repeatable)')
+    quant.add_argument('--frames', type=int, default=100, help='Number of calibration frames')
+    quant.add_argument('--method', choices=['minmax', 'entropy', 'percentile'], default='minmax',
+                       help='Activation range calibration method')
+    quant.add_argument('--conv-only', action='store_true',
+                       help='Only quantize the convolutions (slower, for when the counts drift too much)')
+
+    check = commands.add_parser('compare', help='Report the zone count drift of a model against a reference')
+    check.add_argument('reference', help='FP32 ONNX model')
+    check.add_argument('candidate', help='INT8 ONNX model')
+    check.add_argument('-i', '--input', required=True, help='Reference clip')
+    check.add_argument('--conf', type=float, default=0.5, help='Detection confidence threshold')
+    check.add_argument('--max-frames', type=int, default=0, help='Only compare the first N frames (0 = all)')
+
+    for command in (export, quant, check):
+        command.add_argument('--zones', help='Zone configuration file (see zones.json); sets the frame size')
+        command.add_argument('--imgsz', type=int, default=1280, help='Detector input size')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_zones(args.zones) if args.zones else None
+    frame_size = config['frame_size'] if config else (1280, 1152)
+    if args.command == 'export':
+        print(EXPORTERS[args.source](args.model, args.output, frame_size, args.imgsz))
+    elif args.command == 'quantize':
+        print(quantize(args.model, args.output, args.calibration, args.frames, frame_size, args.imgsz, args.method,
+                       args.conv_only))
+    else:
+        if config is None:
+            from counter import DEFAULT_ZONE
+            config = {'zones': [DEFAULT_ZONE], 'names': ['region']}
+        compare(args.reference, args.candidate, args.input, config['zones'], config['names'], frame_size,
+                args.conf, args.imgsz, args.max_frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import time
+import numpy as np
+
+
+class ResolutionController:
+    """
+    Picks the detector input size (imgsz, the longest side of the letterboxed input) among `sizes`
+    from the scene and a detection latency target. Detection cost grows with the square of the
+    size, so small sizes are used while the scene allows them.
+
+    The decision is taken at the end of every window of `window` detected frames, from the
+    smallest people (10th percentile of box heights, median over the window) and the largest
+    crowd of the window. The size steps up when people would be smaller than `min_height` input
+    pixels or the crowd reaches `dense`, as long as the larger size is expected to meet the
+    `latency` target (seconds per frame, 0 = none); it steps down when the target is missed, or
+    when people stay at least `margin` times `min_height` at the smaller size and the crowd
+    below `dense / margin`. The margin between the thresholds keeps the size from oscillating.
+    """
+
+    def __init__(self, sizes=(640, 960, 1280), frame_size=(1280, 1152), latency=0., min_height=32., dense=15,
+                 window=10, margin=1.5):
+        self.sizes = sorted(int(size) for size in sizes)
+        self.frame_size = tuple(frame_size)
+        self.latency = latency
+        self.min_height = min_height
+        self.dense = dense
+        self.window = window
+        self.margin = margin
+        # start at the largest size, the scene is unknown
+        self.index = len(self.sizes) - 1
+        # detection seconds per frame at each size (moving average), filled by warm_up and observe
+        self.seconds = {}
+        self.heights = []
+        self.counts = []
+        self.frames = {size: 0 for size in self.sizes}
+        self.changes = 0
+
+    @property
+    def size(self):
+        return self.sizes[self.index]
+
+    def scale(self, size):
+        """
+        Returns the factor from frame to model input pixels at `size`.
+        """
+        return size / float(max(self.frame_size))
+
+    def warm_up(self, detect, runs=2, cache=None):
+        """
+        Runs `detect(size)` (one detection at that input size) `runs` times at every size, so the
+        one-off costs of a new input shape (allocations, kernel selection, letterbox buffers) are
+        paid before the first frame rather than when the size changes, and times the last run as
+        the first latency estimate of each size. Sizes found in the `cache` dict (size: seconds)
+        are already warm and skipped; the others are added to it.
+        """
+        cache = {} if cache is None else cache
+        for size in self.sizes:
+            if size not in cache:
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    detect(size)
+                    cache[size] = time.perf_counter() - start
+            self.seconds[size] = cache[size]
+
+    def estimate(self, index):
+        """
+        Returns the expected detection seconds per frame at sizes[index].
+        """
+        size = self.sizes[index]
+        if size in self.seconds:
+            return self.seconds[size]
+        return self.seconds.get(self.size, 0.) * (size / float(self.size)) ** 2
+
+    def observe(self, detections, seconds):
+        """
+        Records the (N, 4+) [x1,y1,x2,y2,...] person detections of one frame detected at the
+        current size, in frame coordinates, and the detection time per frame in seconds.
+        """
+        previous = self.seconds.get(self.size)
+        self.seconds[self.size] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+        self.frames[self.size] += 1
+        heights = detections[:, 3] - detections[:, 1]
+        self.heights.append(np.percentile(heights, 10) if len(heights) else np.inf)
+        self.counts.append(len(detections))
+        if len(self.heights) >= self.window:
+            index = self.choose(float(np.median(self.heights)), max(self.counts))
+            if index != self.index:
+                self.index = index
+                self.changes += 1
+            self.heights, self.counts = [], []
+
+    def choose(self, height, count):
+        """
+        Returns the index of the size to use for people of `height` frame pixels in a crowd of
+        `count`.
+        """
+        index = self.index
+        meets_target = lambda i: not self.latency or self.estimate(i) <= self.latency
+        if (height * self.scale(self.size) < self.min_height or count >= self.dense) \
+                and index + 1 < len(self.sizes) and meets_target(index + 1):
+            return index + 1
+        if index > 0 and not meets_target(index):
+            return index - 1
+        if index > 0 and height * self.scale(self.sizes[index - 1]) >= self.min_height * self.margin \
+                and count < self.dense / self.margin:
+            return index - 1
+        return index
+
+    def state_dict(self):
+        """
+        Returns the runtime state for checkpointing; the settings come from the resumed job.
+        """
+        return {'size': self.size, 'seconds': dict(self.seconds), 'heights': list(self.heights),
+                'counts': list(self.counts), 'frames': dict(self.frames), 'changes': self.changes}
+
+    def load_state_dict(self, state):
+        """
+        Restores a state saved by state_dict(). With other sizes than the checkpoint's, the run
+        continues at the closest size and statistics of the dropped sizes are discarded.
+        """
+        self.index = int(np.argmin([abs(size - state['size']) for size in self.sizes]))
+        self.seconds = {size: seconds for size, seconds in state['seconds'].items() if size in self.frames}
+        self.heights, self.counts = list(state['heights']), list(state['counts'])
+        self.frames = {size: state['frames'].get(size, 0) for size in self.sizes}
+        self.changes = state['changes']
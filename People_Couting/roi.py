@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def roi_rect(polygons, frame_size, pad=64):
+    """
+    Returns the bounding rectangle (x1, y1, x2, y2) of all zone polygons, grown by `pad` pixels so
+    people standing on a zone border are seen whole, and clipped to the (width, height) frame.
+    """
+    points = np.concatenate([np.asarray(polygon).reshape(-1, 2) for polygon in polygons])
+    x1, y1 = np.maximum(points.min(axis=0) - pad, 0)
+    x2, y2 = np.minimum(points.max(axis=0) + pad, frame_size)
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+def roi_fraction(rect, frame_size):
+    """
+    Returns the fraction of the frame's pixels inside the rectangle.
+    """
+    x1, y1, x2, y2 = rect
+    return (x2 - x1) * (y2 - y1) / float(frame_size[0] * frame_size[1])
+
+
+def roi_image_size(rect, frame_size, image_size, stride=32):
+    """
+    Scales the detector input size `image_size` used for full frames down for the crop, so people
+    keep the same resolution they have in a full frame. Returns a multiple of `stride`.
+    """
+    x1, y1, x2, y2 = rect
+    scale = max(x2 - x1, y2 - y1) / float(max(frame_size))
+    return int(np.ceil(image_size * scale / stride) * stride)
+
+
+def crop(frame, rect):
+    x1, y1, x2, y2 = rect
+    return frame[y1:y2, x1:x2]
+
+
+def to_frame(boxes, rect):
+    """
+    Shifts [x1,y1,x2,y2,...] boxes detected in the crop back to full-frame coordinates.
+    """
+    boxes = np.array(boxes, dtype=float, ndmin=2)
+    boxes[:, [0, 2]] += rect[0]
+    boxes[:, [1, 3]] += rect[1]
+    return boxes
@@ -0,0 +1,146 @@
+"""
+Pipeline runner shared by all detection backends: detection (see detectors.py), SORT tracking and
+zone counting with the same video loop and optimisations (batching, detector stride, motion gate,
+ROI, pipelining, sharding, checkpoints) whatever the model, so backends can be compared fairly.
+
+    python runner.py --backend yolov8 -i video.mp4 -o out.mp4 --zones zones.json --batch-size 8
+    python runner.py --backend detectron2 -i video.mp4 --headless --counts counts.csv
+    python runner.py --backend onnx --model yolov8s_int8.onnx -i video.mp4 --headless  # CPU, see quantize.py
+    python runner.py --backend yolov8 -i rtsp://camera/stream --live --latency 0.3 --headless
+    python runner.py --backend onnx -i video.mp4 --headless --resolutions 640,960,1280 --detect-latency 0.05
+    python runner.py --backend yolov8 -i video.mp4 --headless --metrics-port 9100 --metrics-log metrics.jsonl
+    python runner.py --backend yolov8 -i video.mp4 --headless --zones zones.json --detection-cache cache/
+
+YoloNas.py, YoloV5.py, YoloV8.py, super.py and Detectron.py are entry points of this runner with
+their backend, output file and zones as defaults.
+"""
+import argparse
+from detectors import BACKENDS
+from counter import PeopleCounter
+from zones import load_zones
+import metrics
+
+
+def parse_args(argv=None, backend='yolo_nas', output='output.mp4', zones=None):
+    parser = argparse.ArgumentParser(description='Detect, track and count the persons in the polygon zones of a video')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=backend, help='Detection model to use')
+    parser.add_argument('--model', help="Model name or weights of the backend (default: the backend's own)")
+    parser.add_argument('--conf', type=float, default=0.5, help='Detection confidence threshold')
+    parser.add_argument('-i', '--input', default=r'AI_Intern_Video_Tech_Task.mp4')
+    parser.add_argument('-o', '--output', default=output)
+    parser.add_argument('--classes', default='classes.txt')
+    parser.add_argument('--zones', default=zones,
+                        help='Zone configuration file (see zones.json); default: the mall video zone')
+    parser.add_argument('--stride', type=int, default=1,
+                        help='Run the detector every N frames; tracks are predicted in between')
+    parser.add_argument('--adaptive-stride', action='store_true',
+                        help='Shorten the stride automatically when tracks move fast or are uncertain')
+    parser.add_argument('--checkpoint-every', type=int, default=0,
+                        help='Checkpoint the job every N frames so it can be resumed (0 = off)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the last checkpoint')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='Overlap decoding, inference and encoding in separate threads')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Number of frames the detector processes in one forward pass')
+    parser.add_argument('--headless', action='store_true',
+                        help='Only count: no preview window, annotation or output video')
+    parser.add_argument('--no-preview', action='store_true', help='Write the annotated video without showing it')
+    parser.add_argument('--counts', default='counts.csv', help='CSV file the headless mode logs counts to')
+    parser.add_argument('--per-second', action='store_true', help='Log one counts row per second instead of per frame')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='Split the video into N segments counted in parallel processes (implies --headless)')
+    parser.add_argument('--shard-overlap', type=int, default=50,
+                        help='Frames shared by consecutive segments to stitch tracks across them')
+    parser.add_argument('--roi', action='store_true',
+                        help='Run the detector only on the padded bounding rectangle of the zones')
+    parser.add_argument('--roi-pad', type=int, default=64, help='Padding around the zones for --roi, in pixels')
+    parser.add_argument('--motion-gate', action='store_true',
+                        help='Skip the detector on frames without motion in the zones and reuse the last detections')
+    parser.add_argument('--motion-threshold', type=float, default=0.005,
+                        help='Fraction of zone pixels that must change to run the detector')
+    parser.add_argument('--max-skip', type=int, default=25,
+                        help='Run the detector at least once every N frames with the motion gate')
+    parser.add_argument('--line', action='append', default=[], type=lambda s: [float(v) for v in s.split(',')],
+                        metavar='X1,Y1,X2,Y2', help='Entry/exit line to count crossings of (repeatable)')
+    parser.add_argument('--resolutions', type=lambda s: [int(v) for v in s.split(',')], metavar='SIZE,SIZE,...',
+                        help='Detector input sizes to choose from by scene and --detect-latency '
+                             '(yolov5, yolov8, detectron2, onnx)')
+    parser.add_argument('--detect-latency', type=float, default=0.,
+                        help='With --resolutions, target detection seconds per frame (0 = none)')
+    parser.add_argument('--live', action='store_true',
+                        help='Live source (camera index or stream URL): process the newest frame, drop the rest')
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help='With --live, drop frames older than this many seconds')
+    parser.add_argument('--replay', action='store_true',
+                        help='With --live, read a video file at its frame rate as a stand-in camera')
+    parser.add_argument('--preallocate', action='store_true',
+                        help='yolov8: letterbox frames into reused input buffers and pass the model a tensor')
+    parser.add_argument('--detection-cache', metavar='DIR',
+                        help='Record the detections of the video in DIR, or replay them if already recorded with '
+                             'the same video and detector settings, to rerun tracking and counting without the model')
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.live and (args.checkpoint_every or args.resume or args.shards > 1 or args.pipelined):
+        parser.error('--live cannot be combined with --checkpoint-every, --resume, --shards or --pipelined')
+    if args.preallocate and args.backend != 'yolov8':
+        parser.error('--preallocate is only supported by the yolov8 backend')
+    if args.shards > 1 and (args.checkpoint_every or args.resume):
+        parser.error('--shards cannot be combined with --checkpoint-every or --resume')
+    if args.detection_cache and (args.live or args.shards > 1 or args.checkpoint_every or args.resume
+                                 or args.motion_gate or args.resolutions):
+        parser.error('--detection-cache covers whole videos detected at one input size, it cannot be combined with '
+                     '--live, --shards, --checkpoint-every, --resume, --motion-gate or --resolutions')
+    return args
+
+
+def build_counter(args, detector=None):
+    """
+    Creates the PeopleCounter described by parsed command line arguments, optionally with an
+    already loaded `detector` for the backend. With --shards only the worker processes load the
+    model.
+    """
+    backend_options = {'conf': args.conf}
+    if args.model:
+        backend_options['model'] = args.model
+    if args.preallocate:
+        backend_options['preallocate'] = True
+    zones, frame_size, lines = None, (1280, 1152), list(args.line)
+    if args.zones:
+        config = load_zones(args.zones)
+        zones, frame_size, lines = config['zones'], config['frame_size'], config['lines'] + lines
+    return PeopleCounter(args.input, args.output, args.classes, detector_stride=args.stride,
+                         adaptive_stride=args.adaptive_stride, checkpoint_every=args.checkpoint_every,
+                         resume=args.resume, lines=lines, headless=args.headless or args.shards > 1,
+                         roi=args.roi, roi_pad=args.roi_pad, motion_gate=args.motion_gate,
+                         motion_threshold=args.motion_threshold, max_skip=args.max_skip, backend=args.backend,
+                         backend_options=backend_options, zones=zones, frame_size=frame_size, detector=detector,
+                         resolutions=args.resolutions, detect_latency=args.detect_latency,
+                         metrics=metrics.from_args(args), detection_cache=args.detection_cache,
+                         load_model=args.shards <= 1)
+
+
+def run_counter(people_counter, args):
+    if args.live:
+        people_counter.process_stream(args.latency, replay=args.replay,
+                                      counts_path=args.counts if args.headless else None,
+                                      per_second=args.per_second, preview=not args.no_preview)
+    elif args.shards > 1:
+        people_counter.count_video_sharded(args.counts, args.shards, overlap=args.shard_overlap,
+                                           per_second=args.per_second, batch_size=args.batch_size)
+    elif args.headless:
+        people_counter.count_video(args.counts, per_second=args.per_second, batch_size=args.batch_size)
+    else:
+        people_counter.process_video(pipelined=args.pipelined, batch_size=args.batch_size,
+                                     preview=not args.no_preview)
+
+
+def run(args, detector=None):
+    run_counter(build_counter(args, detector), args)
+
+
+def main(argv=None, backend='yolo_nas', output='output.mp4', zones=None):
+    run(parse_args(argv, backend=backend, output=output, zones=zones))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Long-lived counting service. Video jobs are queued in a local SQLite database, and worker
+processes that keep a warm model of one backend count them one after another. The model load and
+warm-up is paid once per worker instead of once per clip. A job is a runner.py command line
+(without --shards); relative paths in it are resolved against the directory it was submitted from.
+
+    python server.py submit -- --backend yolov8 -i clip1.mp4 --headless --counts clip1.csv
+    python server.py serve --backend yolov8 --model yolov8s.pt --workers 4 --threads 2
+    python server.py status
+
+Each server serves one backend; several servers (one per backend or model) can share a queue.
+A server claims only the jobs of its backend. The job's own --model and --conf are ignored in
+favour of the server's.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import numpy as np
+import cv2
+from sort import KalmanBoxTracker
+from detectors import BACKENDS, load_detector
+from runner import parse_args as parse_job_args, build_counter, run_counter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    backend TEXT NOT NULL,
+    args TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker INTEGER,
+    submitted REAL,
+    started REAL,
+    finished REAL,
+    frames INTEGER,
+    setup_seconds REAL,
+    run_seconds REAL,
+    error TEXT
+)
+"""
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """
+    Job queue in a SQLite table. Jobs go from 'queued' to 'running' (claimed by a worker process)
+    to 'done' or 'failed'. Claims are atomic, so any number of workers can share the database.
+    """
+
+    def __init__(self, path='jobs.db'):
+        # autocommit, with explicit transactions where a read and a write must be atomic
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute(SCHEMA)
+
+    def submit(self, backend, args, cwd):
+        cursor = self.db.execute("INSERT INTO jobs (backend, args, cwd, submitted) VALUES (?, ?, ?, ?)",
+                                 (backend, json.dumps(list(args)), cwd, time.time()))
+        return cursor.lastrowid
+
+    def claim(self, backend, worker):
+        """
+        Marks the oldest queued job of the backend as running by `worker` (a pid) and returns it as
+        a dict, or returns None when there is none.
+        """
+        # commits, or rolls back on errors
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute("SELECT * FROM jobs WHERE status = 'queued' AND backend = ? ORDER BY id LIMIT 1",
+                                  (backend,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                                (worker, time.time(), row['id']))
+        if row is None:
+            return None
+        job = dict(row)
+        job['args'] = json.loads(job['args'])
+        return job
+
+    def finish(self, job_id, frames, setup_seconds, run_seconds):
+        self.db.execute("UPDATE jobs SET status = 'done', finished = ?, frames = ?, setup_seconds = ?, "
+                        "run_seconds = ? WHERE id = ?", (time.time(), frames, setup_seconds, run_seconds, job_id))
+
+    def fail(self, job_id, error):
+        self.db.execute("UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                        (time.time(), error, job_id))
+
+    def requeue_orphans(self, backend):
+        """
+        Puts the running jobs of the backend whose worker process is gone back in the queue.
+        Returns their number.
+        """
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            rows = self.db.execute("SELECT id, worker FROM jobs WHERE status = 'running' AND backend = ?",
+                                   (backend,)).fetchall()
+            orphans = [row['id'] for row in rows if row['worker'] is None or not _alive(row['worker'])]
+            self.db.executemany("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?",
+                                [(job_id,) for job_id in orphans])
+        return len(orphans)
+
+    def jobs(self):
+        return [dict(row) for row in self.db.execute("SELECT * FROM jobs ORDER BY id")]
+
+
+def run_job(queue, job, detector, backend_options=None):
+    """
+    Counts one job with the worker's loaded detector, built with `backend_options`, and records its
+    timings: setup (opening the video and building the counter) and run (decoding, detection,
+    tracking and output).
+    """
+    name = f"[worker {os.getpid()}] job {job['id']}"
+    cwd = os.getcwd()
+    imgsz = getattr(detector, 'imgsz', None)
+    start = time.perf_counter()
+    people_counter = None
+    try:
+        os.chdir(job['cwd'])
+        args = parse_job_args(job['args'])
+        args.no_preview = True
+        # the endpoint of one job would still hold the port when the next job starts
+        args.metrics_port = 0
+        # the job runs with the server's model, a detection cache must be keyed by it
+        args.model = (backend_options or {}).get('model')
+        args.conf = (backend_options or {}).get('conf', args.conf)
+        # number tracks from scratch, as a fresh process would
+        KalmanBoxTracker.count = 0
+        people_counter = build_counter(args, detector)
+        if not people_counter.cap.isOpened():
+            raise IOError(f"cannot open {args.input}")
+        setup = time.perf_counter() - start
+        run_counter(people_counter, args)
+        run = time.perf_counter() - start - setup
+        frames = people_counter.out.frame_index
+    except (Exception, SystemExit) as e:
+        queue.fail(job['id'], f"{type(e).__name__}: {e}")
+        print(f"{name} failed: {type(e).__name__}: {e}")
+        return
+    finally:
+        # a failed job leaves its video open and its output segment unfinished
+        if people_counter is not None:
+            people_counter.cap.release()
+            people_counter.out.close()
+        os.chdir(cwd)
+        # a job with --roi or --resolutions leaves its input size on the detector
+        if hasattr(detector, 'imgsz'):
+            detector.imgsz = imgsz
+    queue.finish(job['id'], frames, setup, run)
+    print(f"{name} {args.input}: {frames} frames in {run:.1f} s ({frames / max(run, 1e-9):.1f} fps), "
+          f"setup {setup:.2f} s")
+
+
+def worker(queue_path, backend, backend_options, classnames_path, threads, drain=False, poll=1.):
+    """
+    Worker process: loads and warms up the backend's model once, then runs queued jobs until
+    stopped (or, with drain=True, until the queue has no more jobs of the backend).
+    """
+    start = time.perf_counter()
+    # split the cores between the workers instead of every worker using all of them
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if backend == 'onnx':
+        backend_options = dict(backend_options, threads=threads)
+
+    with open(classnames_path) as f:
+        person_class = f.read().splitlines().index('person')
+    detector = load_detector(backend, **dict(backend_options, classes=[person_class]))
+    # the first inference initialises kernels and allocators, do it before the first job's clock starts
+    detector.detect([np.zeros((1152, 1280, 3), dtype=np.uint8)])
+    print(f"[worker {os.getpid()}] {backend} ready in {time.perf_counter() - start:.1f} s")
+
+    queue = JobQueue(queue_path)
+    while True:
+        job = queue.claim(backend, os.getpid())
+        if job is None:
+            if drain:
+                return
+            time.sleep(poll)
+            continue
+        run_job(queue, job, detector, backend_options)
+
+
+def default_workers(threads):
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    return max(1, cores // threads)
+
+
+def serve(queue_path, backend, backend_options, workers=0, threads=2, classnames_path='classes.txt', drain=False,
+          poll=1.):
+    """
+    Runs `workers` worker processes (default: one per `threads` cores) for the backend and waits
+    for them. Jobs left running by workers that died are queued again first.
+    """
+    requeued = JobQueue(queue_path).requeue_orphans(backend)
+    if requeued:
+        print(f"Requeued {requeued} interrupted job(s).")
+    workers = workers or default_workers(threads)
+    print(f"Serving {backend} jobs from {queue_path} with {workers} worker(s) of {threads} thread(s).")
+    # spawned, not forked, so every worker initialises its own model (and CUDA)
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=worker, name=f'worker-{i}',
+                                 args=(queue_path, backend, backend_options, classnames_path, threads, drain, poll))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def print_status(queue):
+    print(f"{'id':>5} {'status':8} {'backend':10} {'frames':>7} {'setup s':>8} {'run s':>8} {'fps':>7}  input")
+    for job in queue.jobs():
+        try:
+            source = parse_job_args(json.loads(job['args'])).input
+        except SystemExit:
+            source = '?'
+        frames, setup, run = job['frames'], job['setup_seconds'], job['run_seconds']
+        print(f"{job['id']:>5} {job['status']:8} {job['backend']:10} {frames if frames is not None else '':>7} "
+              f"{f'{setup:.2f}' if setup is not None else '':>8} {f'{run:.1f}' if run is not None else '':>8} "
+              f"{f'{frames / max(run, 1e-9):.1f}' if run is not None else '':>7}  {source}"
+              + (f"  ({job['error']})" if job['error'] else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Queue video counting jobs and serve them with warm models')
+    parser.add_argument('--queue', default='jobs.db', help='SQLite job queue')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('submit', help='Queue a job given by runner.py arguments (after --)')
+
+    run = commands.add_parser('serve', help='Run worker processes with warm models for one backend')
+    run.add_argument('--backend', choices=sorted(BACKENDS), default='yolo_nas', help='Detection model to serve')
+    run.add_argument('--model', help="Model name or weights of the backend (default: the backend's own)")
+    run.add_argument('--conf', type=float, default=0.5, help='Detection confidence threshold')
+    run.add_argument('--classes', default='classes.txt')
+    run.add_argument('--workers', type=int, default=0,
+                     help='Number of worker processes (default: available cores / --threads)')
+    run.add_argument('--threads', type=int, default=2, help='Compute threads per worker')
+    run.add_argument('--drain', action='store_true', help='Stop once the queue has no more jobs for the backend')
+    run.add_argument('--poll', type=float, default=1., help='Seconds between queue polls when idle')
+
+    commands.add_parser('status', help='List the jobs with their timings')
+    # the arguments of a job are the ones left over
+    args, job_argv = parser.parse_known_args(argv)
+    if job_argv and args.command != 'submit':
+        parser.error(f"unrecognized arguments: {' '.join(job_argv)}")
+
+    queue = JobQueue(args.queue)
+    if args.command == 'submit':
+        # only a leading '--' separates the job's arguments, later ones are the job's own
+        if job_argv[:1] == ['--']:
+            job_argv = job_argv[1:]
+        job = parse_job_args(job_argv)
+        if job.shards > 1:
+            parser.error('server jobs run in one worker each, start more workers instead of --shards')
+        if job.live:
+            parser.error('live streams never finish, run them with runner.py --live instead')
+        print(f"Queued job {queue.submit(job.backend, job_argv, os.getcwd())}.")
+    elif args.command == 'serve':
+        backend_options = {'conf': args.conf}
+        if args.model:
+            backend_options['model'] = args.model
+        serve(args.queue, args.backend, backend_options, args.workers, args.threads, args.classes, args.drain,
+              args.poll)
+    else:
+        print_status(queue)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sort import iou_batch, linear_assignment
+
+
+def shard_ranges(num_frames, shards, overlap=0):
+    """
+    Splits the frames [0, num_frames) into `shards` contiguous parts and returns a
+    (start, core_start, stop) tuple per part. A shard processes the frames [start, stop); its first
+    core_start - start (= `overlap`, except for the first shard) frames are also covered by the
+    previous shard and only serve to warm up the tracker and to stitch the two shards together.
+    """
+    bounds = np.linspace(0, num_frames, max(1, shards) + 1).round().astype(int)
+    return [(max(0, int(a) - overlap), int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def run_shards(job, ranges, workers=None):
+    """
+    Calls job(start, stop) for every shard in its own worker process and returns the results in
+    shard order. Workers are spawned rather than forked so each one initialises its own model
+    (CUDA cannot be used in a forked process).
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers or len(ranges), mp_context=context) as pool:
+        return list(pool.map(job, [start for start, _, _ in ranges], [stop for _, _, stop in ranges]))
+
+
+def match_tracks(previous, current, iou_threshold=0.3):
+    """
+    Matches the track IDs of two tracker runs over the same frames, given as lists of per-frame
+    (N, 5) [x1,y1,x2,y2,id] arrays. The IoUs of box pairs overlapping by at least iou_threshold are
+    summed per ID pair over all frames, and IDs are paired by linear assignment on these votes.
+
+    Returns a {current_id: previous_id} dict.
+    """
+    pairs = []
+    for a, b in zip(previous, current):
+        if len(a) == 0 or len(b) == 0:
+            continue
+        iou = iou_batch(b, a)
+        i, j = np.nonzero(iou >= iou_threshold)
+        pairs.append(np.stack((b[i, 4], a[j, 4], iou[i, j]), axis=1))
+    if not pairs:
+        return {}
+    pairs = np.concatenate(pairs)
+    current_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    previous_ids, cols = np.unique(pairs[:, 1], return_inverse=True)
+    votes = np.zeros((len(current_ids), len(previous_ids)))
+    np.add.at(votes, (rows, cols), pairs[:, 2])
+    matched = linear_assignment(-votes)
+    return {int(current_ids[r]): int(previous_ids[c]) for r, c in matched if votes[r, c] > 0}
+
+
+def stitch(shard_tracks, ranges, iou_threshold=0.3):
+    """
+    Joins the tracker output of the shards (one list of per-frame arrays per shard, covering its
+    [start, stop) frames) into one list over the whole video with consistent IDs.
+
+    Every shard contributes its core frames. Its IDs are mapped onto the already stitched IDs with
+    match_tracks over the overlap frames, and tracks without a match get new IDs. The first shard
+    keeps its own IDs, so a single shard gives the same result as an unsharded run.
+    """
+    stitched = []
+    next_id = 1
+    for tracks, (start, core, stop) in zip(shard_tracks, ranges):
+        overlap = core - start
+        mapping = match_tracks(stitched[start:core], tracks[:overlap], iou_threshold) if stitched else None
+        frames = []
+        for track_result in tracks[overlap:]:
+            track_result = np.array(track_result, dtype=float).reshape(-1, 5)
+            if mapping is not None:
+                for row, local_id in enumerate(track_result[:, 4].astype(int)):
+                    if local_id not in mapping:
+                        mapping[local_id] = next_id
+                        next_id += 1
+                    track_result[row, 4] = mapping[local_id]
+            frames.append(track_result)
+        for track_result in frames:
+            if len(track_result):
+                next_id = max(next_id, int(track_result[:, 4].max()) + 1)
+        stitched.extend(frames)
+    return stitched
@@ -30,6 +30,8 @@ import glob
 import time
 import argparse
 from filterpy.kalman import KalmanFilter
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 np.random.seed(0)
 
@@ -156,6 +158,185 @@ class KalmanBoxTracker(object):
         return convert_x_to_bbox(self.kf.x)
 
 
+def convert_bboxes_to_z(bboxes):
+    """
+    Vectorised convert_bbox_to_z: takes bboxes of shape (N, >=4) in the form [x1,y1,x2,y2,...]
+      and returns z of shape (N, 4, 1) in the form [x,y,s,r]
+    """
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    x = bboxes[:, 0] + w / 2.
+    y = bboxes[:, 1] + h / 2.
+    s = w * h  # scale is just area
+    r = w / h.astype(float)
+    return np.stack((x, y, s, r), axis=1).reshape((-1, 4, 1))
+
+
+def convert_xs_to_bboxes(xs):
+    """
+    Vectorised convert_x_to_bbox: takes states of shape (N, >=4, 1) in the centre form [x,y,s,r,...]
+      and returns bboxes of shape (N, 4) in the form [x1,y1,x2,y2]
+    """
+    w = np.sqrt(xs[:, 2, 0] * xs[:, 3, 0])
+    h = xs[:, 2, 0] / w
+    return np.stack((xs[:, 0, 0] - w / 2., xs[:, 1, 0] - h / 2., xs[:, 0, 0] + w / 2., xs[:, 1, 0] + h / 2.), axis=1)
+
+
+class KalmanBoxTrackerBatch(object):
+    """
+    Struct-of-arrays counterpart of KalmanBoxTracker: the state, covariance and counters of every
+    live track are held in stacked arrays so predict/update run as one batched matrix operation.
+
+    The filter equations are those of filterpy's KalmanFilter (same F, H, Q, R and initial P as
+    KalmanBoxTracker) evaluated with np.matmul, so results match the per-track trackers exactly.
+    IDs are drawn from KalmanBoxTracker.count so both kinds of tracker share one ID sequence.
+    """
+    F = np.array(
+        [[1, 0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 1], [0, 0, 0, 1, 0, 0, 0],
+         [0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]])
+    H = np.array(
+        [[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]])
+    R = np.eye(4)
+    R[2:, 2:] *= 10.
+    Q = np.eye(7)
+    Q[-1, -1] *= 0.01
+    Q[4:, 4:] *= 0.01
+    P0 = np.eye(7)
+    P0[4:, 4:] *= 1000.  # give high uncertainty to the unobservable initial velocities
+    P0 *= 10.
+
+    def __init__(self, capacity=64):
+        """
+        Allocates room for `capacity` tracks; the arrays grow geometrically when it is exceeded.
+        """
+        self.n = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        n = self.n
+        old = getattr(self, 'x', None)
+        x = np.zeros((capacity, 7, 1))
+        P = np.zeros((capacity, 7, 7))
+        counters = np.zeros((6, capacity), dtype=np.int64)
+        if old is not None:
+            x[:n] = self.x[:n]
+            P[:n] = self.P[:n]
+            counters[:, :n] = self.counters[:, :n]
+        self.x, self.P, self.counters = x, P, counters
+        # named views into the counters block; rows are compacted together
+        self.time_since_update, self.id, self.hits, self.hit_streak, self.age, self.stream = counters
+
+    def __len__(self):
+        return self.n
+
+    def add(self, bboxes, ids=None, stream=0):
+        """
+        Initialises one new track per bbox, in order. New IDs are taken from KalmanBoxTracker.count
+        unless explicit `ids` are given; `stream` tags the tracks with the stream they belong to.
+        """
+        k = len(bboxes)
+        if k == 0:
+            return
+        n = self.n
+        if n + k > self.x.shape[0]:
+            self._allocate(max(2 * self.x.shape[0], n + k))
+        self.x[n:n + k] = 0.
+        self.x[n:n + k, :4] = convert_bboxes_to_z(bboxes)
+        self.P[n:n + k] = self.P0
+        self.counters[:, n:n + k] = 0
+        if ids is None:
+            ids = np.arange(KalmanBoxTracker.count, KalmanBoxTracker.count + k)
+            KalmanBoxTracker.count += k
+        self.id[n:n + k] = ids
+        self.stream[n:n + k] = stream
+        self.n = n + k
+
+    def predict(self, idx=None, count_miss=True):
+        """
+        Advances the tracks at positions `idx` (all tracks by default) and returns their predicted
+        bounding boxes as an (N, 4) array. With count_miss=False only the filter state and age are
+        advanced, for frames on which no detector ran (the frame is not a missed detection).
+        """
+        sel = slice(0, self.n) if idx is None else idx
+        x = self.x[sel]
+        x[(x[:, 6, 0] + x[:, 2, 0]) <= 0, 6] *= 0.0
+        x = np.matmul(self.F, x)
+        self.x[sel] = x
+        self.P[sel] = np.matmul(np.matmul(self.F, self.P[sel]), self.F.T) + self.Q
+        self.age[sel] += 1
+        if count_miss:
+            self.hit_streak[sel] = np.where(self.time_since_update[sel] > 0, 0, self.hit_streak[sel])
+            self.time_since_update[sel] += 1
+        return convert_xs_to_bboxes(x)
+
+    def update(self, idx, bboxes):
+        """
+        Updates the tracks at positions `idx` with the observed bboxes (one per index).
+        """
+        if len(idx) == 0:
+            return
+        self.time_since_update[idx] = 0
+        self.hits[idx] += 1
+        self.hit_streak[idx] += 1
+        x, P = self.x[idx], self.P[idx]
+        y = convert_bboxes_to_z(bboxes) - np.matmul(self.H, x)
+        PHT = np.matmul(P, self.H.T)
+        S = np.matmul(self.H, PHT) + self.R
+        K = np.matmul(PHT, np.linalg.inv(S))
+        self.x[idx] = x + np.matmul(K, y)
+        I_KH = np.eye(7) - np.matmul(K, self.H)
+        self.P[idx] = np.matmul(np.matmul(I_KH, P), I_KH.transpose(0, 2, 1)) + \
+            np.matmul(np.matmul(K, self.R), K.transpose(0, 2, 1))
+
+    def get_state(self):
+        """
+        Returns the current bounding box estimates as an (N, 4) array.
+        """
+        return convert_xs_to_bboxes(self.x[:self.n])
+
+    def motion(self):
+        """
+        Returns per-track (speed, uncertainty) arrays, both relative to the box size (square root of
+        the area): the estimated displacement per frame and the standard deviation of the predicted
+        centre one frame ahead, including the velocity uncertainty.
+        """
+        x, P = self.x[:self.n, :, 0], self.P[:self.n]
+        size = np.sqrt(np.maximum(x[:, 2], 1.))
+        speed = np.hypot(x[:, 4], x[:, 5]) / size
+        uncertainty = np.sqrt(P[:, 0, 0] + P[:, 1, 1] + P[:, 4, 4] + P[:, 5, 5]) / size
+        return speed, uncertainty
+
+    def state_dict(self):
+        """
+        Returns a copy of every track's state and counters, e.g. for checkpointing.
+        """
+        return {'x': self.x[:self.n].copy(), 'P': self.P[:self.n].copy(), 'counters': self.counters[:, :self.n].copy()}
+
+    def load_state_dict(self, state):
+        """
+        Restores the tracks saved by state_dict().
+        """
+        self.n = 0
+        self._allocate(max(self.x.shape[0], len(state['x'])))
+        self.n = len(state['x'])
+        self.x[:self.n] = state['x']
+        self.P[:self.n] = state['P']
+        self.counters[:, :self.n] = state['counters']
+
+    def compact(self, keep):
+        """
+        Drops the tracks where the boolean mask `keep` is False, preserving the order of the rest.
+        """
+        k = int(np.count_nonzero(keep))
+        if k == self.n:
+            return
+        n = self.n
+        self.x[:k] = self.x[:n][keep]
+        self.P[:k] = self.P[:n][keep]
+        self.counters[:, :k] = self.counters[:, :n][:, keep]
+        self.n = k
+
+
 def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
     """
     Assigns detections to tracked object (both represented as bounding boxes)
@@ -176,40 +357,156 @@ def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
     else:
         matched_indices = np.empty(shape=(0, 2))
 
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if (d not in matched_indices[:, 0]):
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if (t not in matched_indices[:, 1]):
-            unmatched_trackers.append(t)
+    matched_indices = np.asarray(matched_indices, dtype=int).reshape(-1, 2)
+    matched_iou = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]]
+    return _split_matches(matched_indices, matched_iou, len(detections), len(trackers), iou_threshold)
+
+
+def _split_matches(matched_indices, matched_iou, num_detections, num_trackers, iou_threshold):
+    """
+    Splits assigned (detection, tracker) pairs into matches and unmatched detections/trackers,
+    sending pairs below the IOU threshold back to the unmatched lists.
+    """
+    det_matched = np.zeros(num_detections, dtype=bool)
+    det_matched[matched_indices[:, 0]] = True
+    trk_matched = np.zeros(num_trackers, dtype=bool)
+    trk_matched[matched_indices[:, 1]] = True
 
     # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if (iou_matrix[m[0], m[1]] < iou_threshold):
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if (len(matches) == 0):
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+    low = matched_iou < iou_threshold
+    unmatched_detections = np.concatenate((np.flatnonzero(~det_matched), matched_indices[low, 0]))
+    unmatched_trackers = np.concatenate((np.flatnonzero(~trk_matched), matched_indices[low, 1]))
+    return matched_indices[~low], unmatched_detections, unmatched_trackers
+
+
+def iou_pairs(bb_test, bb_gt):
+    """
+    Computes IOU between corresponding rows of two equally long arrays of bboxes in the form [x1,y1,x2,y2]
+    """
+    xx1 = np.maximum(bb_test[:, 0], bb_gt[:, 0])
+    yy1 = np.maximum(bb_test[:, 1], bb_gt[:, 1])
+    xx2 = np.minimum(bb_test[:, 2], bb_gt[:, 2])
+    yy2 = np.minimum(bb_test[:, 3], bb_gt[:, 3])
+    w = np.maximum(0., xx2 - xx1)
+    h = np.maximum(0., yy2 - yy1)
+    wh = w * h
+    o = wh / ((bb_test[:, 2] - bb_test[:, 0]) * (bb_test[:, 3] - bb_test[:, 1])
+              + (bb_gt[:, 2] - bb_gt[:, 0]) * (bb_gt[:, 3] - bb_gt[:, 1]) - wh)
+    return (o)
+
+
+def grid_candidate_pairs(detections, trackers, cell_size=None):
+    """
+    Buckets detections and trackers into a uniform spatial grid and returns the index arrays
+    (det_idx, trk_idx) of every pair sharing at least one cell; only these pairs can overlap.
+    The cell size defaults to the median box extent so a box typically covers 1-4 cells.
+    """
+    num_dets = len(detections)
+    boxes = np.concatenate((detections[:, :4], trackers[:, :4])).astype(float)
+    if cell_size is None:
+        extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        cell_size = max(float(np.median(extent)), 1.)
+    origin = boxes[:, :2].min(axis=0)
+    lo = np.floor((boxes[:, :2] - origin) / cell_size).astype(np.int64)
+    hi = np.maximum(np.floor((boxes[:, 2:4] - origin) / cell_size).astype(np.int64), lo)
+    span = hi - lo + 1
+    num_cols = hi[:, 0].max() + 1
+
+    # enumerate (cell, box) entries for every cell covered by every box
+    counts = span[:, 0] * span[:, 1]
+    owner = np.repeat(np.arange(len(boxes)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell = (lo[owner, 1] + k // span[owner, 0]) * num_cols + lo[owner, 0] + k % span[owner, 0]
+
+    # join detection entries against tracker entries sorted by cell
+    is_det = owner < num_dets
+    order = np.argsort(cell[~is_det], kind='stable')
+    trk_cell = cell[~is_det][order]
+    trk_owner = owner[~is_det][order] - num_dets
+    det_cell = cell[is_det]
+    start = np.searchsorted(trk_cell, det_cell, side='left')
+    n = np.searchsorted(trk_cell, det_cell, side='right') - start
+    det_idx = np.repeat(owner[is_det], n)
+    trk_idx = trk_owner[np.repeat(start, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)]
+
+    # boxes sharing several cells produce duplicate pairs
+    pairs = np.sort(det_idx * len(trackers) + trk_idx)
+    pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+    return pairs // len(trackers), pairs % len(trackers)
+
+
+def associate_detections_to_trackers_gated(detections, trackers, iou_threshold=0.3, cell_size=None):
+    """
+    Sparse, spatially gated variant of associate_detections_to_trackers.
+
+    IOU is only computed for pairs sharing a grid cell. Pairs below iou_threshold can never be
+    accepted as matches, so they are gated out; the remaining graph is split into connected
+    components and a small assignment problem is solved per component, so the cost grows roughly
+    linearly with the number of boxes. Components that are a single pair are resolved directly.
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    Unlike the dense version, the solver never trades an above-threshold pair for a combination of
+    sub-threshold ones that would be rejected afterwards, so it can keep strictly more matches.
+
+    Returns 3 lists of matches, unmatched_detections and unmatched_trackers
+    """
+    if (len(trackers) == 0):
+        return np.empty((0, 2), dtype=int), np.arange(len(detections)), np.empty((0, 5), dtype=int)
+    if (len(detections) == 0):
+        return np.empty((0, 2), dtype=int), np.empty(0, dtype=int), np.arange(len(trackers))
+
+    num_dets, num_trks = len(detections), len(trackers)
+    det_idx, trk_idx = grid_candidate_pairs(detections, trackers, cell_size)
+    iou = iou_pairs(detections[det_idx], trackers[trk_idx])
+    gate = iou >= iou_threshold
+    det_idx, trk_idx, iou = det_idx[gate], trk_idx[gate], iou[gate]
+
+    # split the bipartite overlap graph into independent components
+    graph = coo_matrix((np.ones(len(det_idx)), (det_idx, num_dets + trk_idx)),
+                       shape=(num_dets + num_trks, num_dets + num_trks))
+    num_components, labels = connected_components(graph, directed=False)
+    component = labels[det_idx]
+
+    det_degree = np.bincount(det_idx, minlength=num_dets)
+    trk_degree = np.bincount(trk_idx, minlength=num_trks)
+    ambiguous = np.zeros(num_components, dtype=bool)
+    ambiguous[component[(det_degree[det_idx] > 1) | (trk_degree[trk_idx] > 1)]] = True
+
+    direct = ~ambiguous[component]
+    matched = [np.stack((det_idx[direct], trk_idx[direct]), axis=1)]
+
+    edges = np.flatnonzero(ambiguous[component])
+    edges = edges[np.argsort(component[edges], kind='stable')]
+    bounds = np.flatnonzero(np.diff(component[edges])) + 1
+    groups = np.split(edges, bounds) if len(edges) else []
+    for group in groups:
+        dets, d_local = np.unique(det_idx[group], return_inverse=True)
+        trks, t_local = np.unique(trk_idx[group], return_inverse=True)
+        sub = np.zeros((len(dets), len(trks)))
+        sub[d_local, t_local] = iou[group]
+        local = linear_assignment(-sub).reshape(-1, 2)
+        matched.append(np.stack((dets[local[:, 0]], trks[local[:, 1]]), axis=1))
+
+    matched_indices = np.concatenate(matched)
+    matched_indices = matched_indices[np.argsort(matched_indices[:, 0], kind='stable')]
+    # look the assigned pairs up among the (sorted) gated edges; any other pair counts as IOU 0
+    edge_keys = det_idx * num_trks + trk_idx
+    keys = matched_indices[:, 0] * num_trks + matched_indices[:, 1]
+    pos = np.minimum(np.searchsorted(edge_keys, keys), len(edge_keys) - 1)
+    matched_iou = np.where(edge_keys[pos] == keys, iou[pos], 0.)
+    return _split_matches(matched_indices, matched_iou, num_dets, num_trks, iou_threshold)
 
 
 class Sort(object):
-    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, gated=False):
         """
-        Sets key parameters for SORT
+        Sets key parameters for SORT. With gated=True association uses the sparse, grid-gated
+        solver (associate_detections_to_trackers_gated), which scales better in dense crowds.
         """
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
-        self.trackers = []
+        self.gated = gated
+        self.trackers = KalmanBoxTrackerBatch()
         self.frame_count = 0
 
     def update(self, dets=np.empty((0, 5))):
@@ -222,40 +519,284 @@ class Sort(object):
         NOTE: The number of objects returned may differ from the number of detections provided.
         """
         self.frame_count += 1
-        # get predicted locations from existing trackers.
+        # get predicted locations from existing trackers, dropping any that became invalid
+        pos = self.trackers.predict()
+        valid = ~np.isnan(pos).any(axis=1)
+        self.trackers.compact(valid)
         trks = np.zeros((len(self.trackers), 5))
-        to_del = []
-        ret = []
-        for t, trk in enumerate(trks):
-            pos = self.trackers[t].predict()[0]
-            trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-            if np.any(np.isnan(pos)):
-                to_del.append(t)
-        trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-        for t in reversed(to_del):
-            self.trackers.pop(t)
-        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+        trks[:, :4] = pos[valid]
+        associate = associate_detections_to_trackers_gated if self.gated else associate_detections_to_trackers
+        matched, unmatched_dets, unmatched_trks = associate(dets, trks, self.iou_threshold)
 
         # update matched trackers with assigned detections
-        for m in matched:
-            self.trackers[m[1]].update(dets[m[0], :])
+        self.trackers.update(matched[:, 1], dets[matched[:, 0], :])
 
         # create and initialise new trackers for unmatched detections
-        for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i, :])
-            self.trackers.append(trk)
-        i = len(self.trackers)
-        for trk in reversed(self.trackers):
-            d = trk.get_state()[0]
-            if (trk.time_since_update < 1) and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
-                ret.append(np.concatenate((d, [trk.id + 1])).reshape(1, -1))  # +1 as MOT benchmark requires positive
-            i -= 1
-            # remove dead tracklet
-            if (trk.time_since_update > self.max_age):
-                self.trackers.pop(i)
-        if (len(ret) > 0):
-            return np.concatenate(ret)
-        return np.empty((0, 5))
+        self.trackers.add(dets[np.asarray(unmatched_dets, dtype=int), :])
+
+        n = len(self.trackers)
+        time_since_update = self.trackers.time_since_update[:n]
+        report = (time_since_update < 1) & \
+                 ((self.trackers.hit_streak[:n] >= self.min_hits) | (self.frame_count <= self.min_hits))
+        ret = np.empty((0, 5))
+        if report.any():
+            d = self.trackers.get_state()[report]
+            ids = self.trackers.id[:n][report] + 1  # +1 as MOT benchmark requires positive
+            ret = np.concatenate((d, ids[:, None]), axis=1)[::-1]
+        # remove dead tracklets
+        self.trackers.compact(time_since_update <= self.max_age)
+        return ret
+
+    def state_dict(self):
+        """
+        Returns the full tracker state (parameters, frame counter, tracks and the global ID counter)
+        as a picklable dict, e.g. for checkpointing long jobs.
+        """
+        return {'max_age': self.max_age, 'min_hits': self.min_hits, 'iou_threshold': self.iou_threshold,
+                'gated': self.gated, 'frame_count': self.frame_count, 'next_id': KalmanBoxTracker.count,
+                'trackers': self.trackers.state_dict()}
+
+    def load_state_dict(self, state):
+        """
+        Restores a state saved by state_dict(), including the global ID counter.
+        """
+        self.max_age = state['max_age']
+        self.min_hits = state['min_hits']
+        self.iou_threshold = state['iou_threshold']
+        self.gated = state['gated']
+        self.frame_count = state['frame_count']
+        KalmanBoxTracker.count = state['next_id']
+        self.trackers.load_state_dict(state['trackers'])
+
+    def predict(self):
+        """
+        Advances every track by one frame for which no detections exist (e.g. the detector was
+        skipped) and returns the predicted boxes of the tracks reported by the last update, in the
+        same [x1,y1,x2,y2,id] format. Unlike update(np.empty((0, 5))) this is not counted as a
+        missed detection, so tracks are neither aged out nor lose their hit streak.
+        """
+        pos = self.trackers.predict(count_miss=False)
+        n = len(self.trackers)
+        report = (self.trackers.time_since_update[:n] < 1) & \
+                 ((self.trackers.hit_streak[:n] >= self.min_hits) | (self.frame_count <= self.min_hits)) & \
+                 ~np.isnan(pos).any(axis=1)
+        ids = self.trackers.id[:n][report] + 1  # +1 as MOT benchmark requires positive
+        return np.concatenate((pos[report], ids[:, None]), axis=1)[::-1]
+
+
+class MultiStreamSort(object):
+    """
+    Tracks many independent streams (e.g. one per camera) in a single process.
+
+    Each stream has its own ID namespace and frame counter and behaves exactly like a dedicated
+    Sort instance, but the tracks of all streams live in one KalmanBoxTrackerBatch, so Kalman
+    predict and update run once per call for every stream together. With gated=True association
+    is also batched: the streams are laid side by side so one grid-gated solve covers all of them.
+    """
+
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, gated=False):
+        """
+        Sets key parameters for SORT, shared by every stream
+        """
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.gated = gated
+        self.trackers = KalmanBoxTrackerBatch()
+        self.streams = {}  # stream key -> internal stream index
+        self.frame_count = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)  # next track ID, per stream
+
+    def _stream_index(self, key):
+        if key not in self.streams:
+            self.streams[key] = len(self.frame_count)
+            self.frame_count = np.append(self.frame_count, 0)
+            self.count = np.append(self.count, 0)
+        return self.streams[key]
+
+    def remove_stream(self, key):
+        """
+        Forgets a stream and all of its tracks.
+        """
+        s = self.streams.pop(key)
+        n = len(self.trackers)
+        self.trackers.compact(self.trackers.stream[:n] != s)
+
+    def update(self, frame_dets):
+        """
+        Params:
+          frame_dets - one frame of detections per stream, either a dict {stream key: dets} or a list
+            indexed by stream, where dets is a numpy array in the format [[x1,y1,x2,y2,score],...]
+        Requires: each stream must be passed once per frame, even with empty detections. Streams left
+          out of a call are not advanced.
+        Returns the same structure holding, per stream, the output Sort.update would give for it.
+        """
+        as_dict = isinstance(frame_dets, dict)
+        items = list(frame_dets.items()) if as_dict else list(enumerate(frame_dets))
+        if not items:
+            return {} if as_dict else []
+        keys = [k for k, _ in items]
+        det_list = [np.asarray(d, dtype=float).reshape(len(d), -1) if len(d) else np.empty((0, 5)) for _, d in items]
+        sidx = np.array([self._stream_index(k) for k in keys])
+        self.frame_count[sidx] += 1
+        trackers = self.trackers
+
+        # get predicted locations of these streams' tracks, dropping any that became invalid
+        active = np.flatnonzero(np.isin(trackers.stream[:len(trackers)], sidx))
+        pos = trackers.predict(active)
+        invalid = np.isnan(pos).any(axis=1)
+        if invalid.any():
+            keep = np.ones(len(trackers), dtype=bool)
+            keep[active[invalid]] = False
+            trackers.compact(keep)
+            active = np.flatnonzero(np.isin(trackers.stream[:len(trackers)], sidx))
+            pos = pos[~invalid]
+        trk_stream = trackers.stream[active]
+
+        all_dets = np.concatenate([d[:, :4] for d in det_list]).astype(float)
+        det_stream = np.repeat(sidx, [len(d) for d in det_list])
+        if self.gated:
+            matched, unmatched_dets = self._associate_gated(sidx, all_dets, det_stream, pos, trk_stream)
+        else:
+            matched, unmatched_dets = self._associate_per_stream(sidx, det_list, pos, trk_stream)
+
+        # update matched trackers with assigned detections
+        trackers.update(active[matched[:, 1]], all_dets[matched[:, 0]])
+
+        # create and initialise new trackers for unmatched detections, numbering them per stream
+        new_stream = det_stream[unmatched_dets]
+        order = np.argsort(new_stream, kind='stable')
+        unmatched_dets, new_stream = unmatched_dets[order], new_stream[order]
+        rank = np.arange(len(new_stream)) - np.searchsorted(new_stream, new_stream)
+        trackers.add(all_dets[unmatched_dets], ids=self.count[new_stream] + rank, stream=new_stream)
+        self.count += np.bincount(new_stream, minlength=len(self.count))
+
+        n = len(trackers)
+        stream = trackers.stream[:n]
+        time_since_update = trackers.time_since_update[:n]
+        report = np.flatnonzero((time_since_update < 1) & ((trackers.hit_streak[:n] >= self.min_hits) |
+                                                           (self.frame_count[stream] <= self.min_hits)))
+        rows = np.concatenate((convert_xs_to_bboxes(trackers.x[report]), trackers.id[report, None] + 1), axis=1)
+        order = np.argsort(stream[report], kind='stable')
+        rows, report_stream = rows[order], stream[report][order]
+        starts = np.searchsorted(report_stream, sidx, side='left')
+        stops = np.searchsorted(report_stream, sidx, side='right')
+        ret = [rows[a:b][::-1] for a, b in zip(starts, stops)]
+
+        # remove dead tracklets
+        trackers.compact(time_since_update <= self.max_age)
+        return dict(zip(keys, ret)) if as_dict else ret
+
+    def _associate_per_stream(self, sidx, det_list, pos, trk_stream):
+        """
+        Runs associate_detections_to_trackers separately for each stream. Returns the matches as
+        (global detection index, active track index) pairs and the unmatched global detection indices.
+        """
+        order = np.argsort(trk_stream, kind='stable')
+        starts = np.searchsorted(trk_stream[order], sidx, side='left')
+        stops = np.searchsorted(trk_stream[order], sidx, side='right')
+        matched, unmatched = [np.empty((0, 2), dtype=int)], [np.empty(0, dtype=int)]
+        offset = 0
+        for dets, a, b in zip(det_list, starts, stops):
+            g = order[a:b]
+            trks = np.zeros((len(g), 5))
+            trks[:, :4] = pos[g]
+            m, unmatched_dets, _ = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+            matched.append(np.stack((m[:, 0] + offset, g[m[:, 1]]), axis=1))
+            unmatched.append(np.asarray(unmatched_dets, dtype=int) + offset)
+            offset += len(dets)
+        return np.concatenate(matched), np.concatenate(unmatched)
+
+    def _associate_gated(self, sidx, all_dets, det_stream, pos, trk_stream):
+        """
+        Associates all streams in one associate_detections_to_trackers_gated call by shifting each
+        stream's boxes along x far enough that boxes of different streams can never overlap.
+        """
+        if len(all_dets) == 0 or len(pos) == 0:
+            return np.empty((0, 2), dtype=int), np.arange(len(all_dets))
+        slot = np.zeros(len(self.frame_count))
+        slot[sidx] = np.arange(len(sidx))
+        boxes = np.concatenate((all_dets, pos))
+        stride = boxes[:, [0, 2]].max() - boxes[:, [0, 2]].min() + 1.
+        shifted_dets = all_dets + (slot[det_stream] * stride)[:, None] * [1, 0, 1, 0]
+        shifted_trks = pos + (slot[trk_stream] * stride)[:, None] * [1, 0, 1, 0]
+        matched, unmatched_dets, _ = associate_detections_to_trackers_gated(shifted_dets, shifted_trks,
+                                                                            self.iou_threshold)
+        return matched, np.asarray(unmatched_dets, dtype=int)
+
+
+MOT_RESULT_ROW = '%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1\n'
+
+
+def load_sequence(seq_dets_fn):
+    """
+    Loads a MOT det.txt once and indexes it by frame.
+
+    Returns (dets, offsets): dets holds the [x1,y1,x2,y2,score] rows sorted by frame (stable, so the
+    file order is kept within a frame) and the detections of frame f (numbered from 1) are
+    dets[offsets[f - 1]:offsets[f]].
+    """
+    seq_dets = np.loadtxt(seq_dets_fn, delimiter=',', ndmin=2)
+    frames = seq_dets[:, 0].astype(np.int64)
+    order = np.argsort(frames, kind='stable')
+    frames = frames[order]
+    dets = seq_dets[order, 2:7]
+    dets[:, 2:4] += dets[:, 0:2]  # convert to [x1,y1,w,h] to [x1,y1,x2,y2]
+    num_frames = int(frames[-1]) if len(frames) else 0
+    offsets = np.searchsorted(frames, np.arange(num_frames + 1), side='right')
+    return dets, offsets
+
+
+def write_results(out_file, blocks):
+    """
+    Writes buffered [frame,id,x,y,w,h] result blocks to a MOT results file in one call.
+    """
+    if blocks:
+        rows = np.concatenate(blocks).tolist()
+        out_file.write(''.join([MOT_RESULT_ROW % tuple(row) for row in rows]))
+
+
+def run_sequence(seq_dets_fn, out_path, max_age=1, min_hits=3, iou_threshold=0.3, gated=False,
+                 flush_every=1000, frame_callback=None):
+    """
+    Tracks one MOT sequence and writes its results to out_path.
+
+    Detections are grouped by frame once and fed to the tracker as slices; results are buffered and
+    written in bulk every `flush_every` frames. Track IDs restart at 1 for every sequence so the
+    output does not depend on which process ran it. `frame_callback(frame, trackers)` is called after
+    every frame if given (used for display).
+
+    Returns (total_time, total_frames), the time spent in Sort.update and the number of frames.
+    """
+    KalmanBoxTracker.count = 0
+    mot_tracker = Sort(max_age=max_age,
+                       min_hits=min_hits,
+                       iou_threshold=iou_threshold,
+                       gated=gated)  # create instance of the SORT tracker
+    dets, offsets = load_sequence(seq_dets_fn)
+    total_time = 0.0
+    pending = []
+    with open(out_path, 'w') as out_file:
+        for frame in range(1, len(offsets)):
+            start_time = time.time()
+            trackers = mot_tracker.update(dets[offsets[frame - 1]:offsets[frame]])
+            total_time += time.time() - start_time
+
+            if len(trackers):
+                pending.append(np.column_stack((np.full(len(trackers), frame), trackers[:, 4],
+                                                trackers[:, 0:2], trackers[:, 2:4] - trackers[:, 0:2])))
+            if frame % flush_every == 0:
+                write_results(out_file, pending)
+                pending = []
+            if frame_callback is not None:
+                frame_callback(frame, trackers)
+        write_results(out_file, pending)
+    return total_time, len(offsets) - 1
+
+
+def _run_sequence_job(job):
+    seq, seq_dets_fn, out_path, kwargs = job
+    return (seq,) + run_sequence(seq_dets_fn, out_path, **kwargs)
 
 
 def parse_args():
@@ -272,6 +813,10 @@ def parse_args():
                         help="Minimum number of associated detections before track is initialised.",
                         type=int, default=3)
     parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+    parser.add_argument("--gated", help="Use sparse grid-gated association (faster for crowded scenes) [False]",
+                        action='store_true')
+    parser.add_argument("--workers", help="Number of sequences processed in parallel (0 = all cores) [1].",
+                        type=int, default=1)
     args = parser.parse_args()
     return args
 
@@ -296,47 +841,44 @@ if __name__ == '__main__':
     if not os.path.exists('output'):
         os.makedirs('output')
     pattern = os.path.join(args.seq_path, phase, '*', 'det', 'det.txt')
+    kwargs = dict(max_age=args.max_age, min_hits=args.min_hits, iou_threshold=args.iou_threshold, gated=args.gated)
+    jobs = []
     for seq_dets_fn in glob.glob(pattern):
-        mot_tracker = Sort(max_age=args.max_age,
-                           min_hits=args.min_hits,
-                           iou_threshold=args.iou_threshold)  # create instance of the SORT tracker
-        seq_dets = np.loadtxt(seq_dets_fn, delimiter=',')
         seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
+        jobs.append((seq, seq_dets_fn, os.path.join('output', '%s.txt' % (seq)), kwargs))
 
-        with open(os.path.join('output', '%s.txt' % (seq)), 'w') as out_file:
+    workers = args.workers or os.cpu_count()
+    if display or workers == 1 or len(jobs) <= 1:
+        for seq, seq_dets_fn, out_path, _ in jobs:
             print("Processing %s." % (seq))
-            for frame in range(int(seq_dets[:, 0].max())):
-                frame += 1  # detection and frame numbers begin at 1
-                dets = seq_dets[seq_dets[:, 0] == frame, 2:7]
-                dets[:, 2:4] += dets[:, 0:2]  # convert to [x1,y1,w,h] to [x1,y1,x2,y2]
-                total_frames += 1
-
-                if (display):
-                    fn = os.path.join('mot_benchmark', phase, seq, 'img1', '%06d.jpg' % (frame))
-                    im = io.imread(fn)
-                    ax1.imshow(im)
-                    plt.title(seq + ' Tracked Targets')
-
-                start_time = time.time()
-                trackers = mot_tracker.update(dets)
-                cycle_time = time.time() - start_time
-                total_time += cycle_time
 
+            def show(frame, trackers):
+                fn = os.path.join('mot_benchmark', phase, seq, 'img1', '%06d.jpg' % (frame))
+                im = io.imread(fn)
+                ax1.imshow(im)
+                plt.title(seq + ' Tracked Targets')
                 for d in trackers:
-                    print('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1' % (frame, d[4], d[0], d[1], d[2] - d[0], d[3] - d[1]),
-                          file=out_file)
-                    if (display):
-                        d = d.astype(np.int32)
-                        ax1.add_patch(patches.Rectangle((d[0], d[1]), d[2] - d[0], d[3] - d[1], fill=False, lw=3,
-                                                        ec=colours[d[4] % 32, :]))
-
-                if (display):
-                    fig.canvas.flush_events()
-                    plt.draw()
-                    ax1.cla()
+                    d = d.astype(np.int32)
+                    ax1.add_patch(patches.Rectangle((d[0], d[1]), d[2] - d[0], d[3] - d[1], fill=False, lw=3,
+                                                    ec=colours[d[4] % 32, :]))
+                fig.canvas.flush_events()
+                plt.draw()
+                ax1.cla()
+
+            seq_time, seq_frames = run_sequence(seq_dets_fn, out_path, frame_callback=show if display else None,
+                                                **kwargs)
+            total_time += seq_time
+            total_frames += seq_frames
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            for seq, seq_time, seq_frames in pool.map(_run_sequence_job, jobs):
+                print("Processed %s." % (seq))
+                total_time += seq_time
+                total_frames += seq_frames
 
     print("Total Tracking took: %.3f seconds for %d frames or %.1f FPS" % (
     total_time, total_frames, total_frames / total_time))
 
     if (display):
-        print("Note: to get real runtime results run without the option: --display")
\ No newline at end of file
+        print("Note: to get real runtime results run without the option: --display")
@@ -0,0 +1,163 @@
+import numpy as np
+import cv2
+
+
+class StrideController:
+    """
+    Decides on which frames the detector runs.
+
+    With a fixed stride the detector runs every `stride` frames and the tracker's Kalman
+    predictions (Sort.predict) fill the frames in between. In adaptive mode the stride is
+    recomputed from the tracker after every detection: it is the number of frames the fastest
+    track needs to move `max_drift` of its box size, capped at `stride`, and it drops to 1 while
+    any track's predicted position is more uncertain than `max_uncertainty` box sizes (new tracks
+    whose velocity is still unknown, or erratic motion).
+    """
+
+    def __init__(self, stride=1, adaptive=False, max_drift=0.25, max_uncertainty=0.5):
+        self.max_stride = max(1, int(stride))
+        self.adaptive = adaptive
+        self.max_drift = max_drift
+        self.max_uncertainty = max_uncertainty
+        self.stride = self.max_stride
+        self.since_detection = None
+        self.detected_frames = 0
+        self.skipped_frames = 0
+
+    def should_detect(self):
+        """
+        Returns True if the detector has to run on the current frame; call once per frame.
+        """
+        if self.since_detection is None or self.since_detection + 1 >= self.stride:
+            self.since_detection = 0
+            self.detected_frames += 1
+            return True
+        self.since_detection += 1
+        self.skipped_frames += 1
+        return False
+
+    def state_dict(self):
+        """
+        Returns the runtime state for checkpointing; the settings come from the resumed job.
+        """
+        return {'stride': self.stride, 'since_detection': self.since_detection,
+                'detected_frames': self.detected_frames, 'skipped_frames': self.skipped_frames}
+
+    def load_state_dict(self, state):
+        """
+        Restores a state saved by state_dict().
+        """
+        self.stride = min(state['stride'], self.max_stride) if self.adaptive else self.max_stride
+        self.since_detection = state['since_detection']
+        self.detected_frames = state['detected_frames']
+        self.skipped_frames = state['skipped_frames']
+
+    def observe(self, tracker):
+        """
+        Updates the stride from the state of a Sort tracker right after a detection frame.
+        """
+        if not self.adaptive:
+            return
+        speed, uncertainty = tracker.trackers.motion()
+        if len(speed) == 0:
+            self.stride = self.max_stride
+        elif np.any(uncertainty > self.max_uncertainty):
+            self.stride = 1
+        else:
+            frames = self.max_drift / max(float(speed.max()), 1e-6)
+            self.stride = int(np.clip(np.floor(frames), 1, self.max_stride))
+
+
+class MotionGate:
+    """
+    Skips detection on frames where nothing moved.
+
+    Frames are downscaled by `scale`, converted to grey, blurred and compared with the last frame
+    the detector ran on. The detector runs when more than `threshold` of the pixels (of the pixels
+    inside the `zones` polygons, if given in full-frame coordinates) changed by more than
+    `pixel_threshold` grey levels, or after `max_skip` skipped frames in a row. Comparing with the
+    last detected frame instead of the previous one lets slow motion add up until it triggers.
+    Static frames get the detections of the last detected frame (see run()).
+    """
+
+    def __init__(self, threshold=0.005, pixel_threshold=25, scale=0.125, max_skip=25, zones=None):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.scale = scale
+        self.max_skip = max_skip
+        self.zones = zones
+        self.mask = None
+        self.reference = None
+        self.last_result = None
+        self.skipped = 0
+        self.detected_frames = 0
+        self.skipped_frames = 0
+
+    def _prepare(self, frame):
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        grey = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        if self.zones is not None and self.mask is None:
+            scale = np.array([grey.shape[1] / float(frame.shape[1]), grey.shape[0] / float(frame.shape[0])])
+            self.mask = np.zeros(grey.shape, dtype=np.uint8)
+            cv2.fillPoly(self.mask, [np.round(np.asarray(zone) * scale).astype(np.int32).reshape(-1, 1, 2)
+                                     for zone in self.zones], 1)
+            self.mask = self.mask.view(bool)
+        return cv2.GaussianBlur(grey, (5, 5), 0)
+
+    def motion(self, grey):
+        """
+        Returns the fraction of (zone) pixels that changed since the reference frame.
+        """
+        changed = cv2.absdiff(grey, self.reference) > self.pixel_threshold
+        if self.mask is not None:
+            return np.count_nonzero(changed & self.mask) / max(np.count_nonzero(self.mask), 1)
+        return np.count_nonzero(changed) / float(changed.size)
+
+    def should_detect(self, frame):
+        """
+        Returns True if the detector has to run on this frame; call once per frame.
+        """
+        grey = self._prepare(frame)
+        # a reference of another size (the scale changed on resume) is replaced like a missing one
+        if self.reference is None or self.reference.shape != grey.shape or self.skipped >= self.max_skip \
+                or self.motion(grey) > self.threshold:
+            self.reference = grey
+            self.skipped = 0
+            self.detected_frames += 1
+            return True
+        self.skipped += 1
+        self.skipped_frames += 1
+        return False
+
+    def run(self, frames, detect):
+        """
+        Calls detect(frames) on the frames with motion only and returns one result per frame, static
+        frames getting the result of the last frame the detector ran on.
+        """
+        run = [self.should_detect(frame) for frame in frames]
+        results = iter(detect([frame for frame, r in zip(frames, run) if r]) if any(run) else [])
+        out = []
+        for r in run:
+            if r:
+                self.last_result = next(results)
+            out.append(self.last_result)
+        return out
+
+    def state_dict(self):
+        """
+        Returns the runtime state for checkpointing; the settings come from the resumed job, and
+        the zone mask is rebuilt from them.
+        """
+        return {'reference': None if self.reference is None else self.reference.copy(),
+                'last_result': self.last_result, 'skipped': self.skipped,
+                'detected_frames': self.detected_frames, 'skipped_frames': self.skipped_frames}
+
+    def load_state_dict(self, state):
+        """
+        Restores a state saved by state_dict().
+        """
+        self.reference = state['reference']
+        self.last_result = state['last_result']
+        self.skipped = state['skipped']
+        self.detected_frames = state['detected_frames']
+        self.skipped_frames = state['skipped_frames']
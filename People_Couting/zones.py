@@ -0,0 +1,27 @@
+import json
+import numpy as np
+
+
+def load_zones(path):
+    """
+    Reads a zone configuration file (JSON):
+
+        {"frame_size": [1280, 1152],
+         "zones": [{"name": "region", "polygon": [[343, 259], [383, 471], ...]}],
+         "lines": [[x1, y1, x2, y2], ...]}
+
+    frame_size is the (width, height) frames are processed at, in which the polygons and the
+    entry/exit lines are given; "lines" is optional. Returns a dict with frame_size (tuple), names,
+    zones (list of (K, 2) arrays) and lines (list of [x1, y1, x2, y2]).
+    """
+    with open(path) as f:
+        config = json.load(f)
+    zones = config.get('zones', [])
+    if not zones:
+        raise ValueError(f"{path}: no zones configured")
+    return {
+        'frame_size': tuple(int(v) for v in config.get('frame_size', (1280, 1152))),
+        'names': [zone.get('name', f'zone{i}') for i, zone in enumerate(zones)],
+        'zones': [np.asarray(zone['polygon'], dtype=np.int32).reshape(-1, 2) for zone in zones],
+        'lines': [[float(v) for v in line] for line in config.get('lines', [])],
+    }